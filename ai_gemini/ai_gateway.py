@@ -0,0 +1,223 @@
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+import httpx
+
+from noitu_bot.config import (
+    OPEN_AI,
+    OPENAI_BASE_URL,
+    AI_MAX_INFLIGHT,
+    AI_BREAKER_FAILURES,
+    AI_BREAKER_RESET_SECONDS,
+)
+
+try:
+    from noitu_bot.monitoring_server import AI_CALLS_COUNTER, AI_CIRCUIT_STATE
+except ImportError:
+    class DummyMetric:
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self):
+            pass
+
+        def set(self, *args, **kwargs):
+            pass
+
+
+    AI_CALLS_COUNTER = DummyMetric()
+    AI_CIRCUIT_STATE = DummyMetric()
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+_STATE_VALUE = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+
+class AIGatewayError(RuntimeError):
+    """Lỗi gọi AI (timeout, lỗi mạng, HTTP lỗi, quá tải, circuit đang mở)."""
+
+
+class AIRequestError(AIGatewayError):
+    """API từ chối request (HTTP 4xx khác 429): lỗi phía mình, không tính là upstream hỏng."""
+
+
+class CircuitOpenError(AIGatewayError):
+    """Upstream đang lỗi: từ chối ngay, không gọi API."""
+
+
+class CircuitBreaker:
+    """
+    closed: gọi bình thường, đếm lỗi liên tiếp; đủ failure_threshold -> open.
+    open: từ chối ngay trong reset_seconds, sau đó half_open.
+    half_open: cho đúng 1 lời gọi thử; thành công -> closed, lỗi -> open lại.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logging.warning("AI circuit breaker: %s -> %s", self.state, state)
+        self.state = state
+        AI_CIRCUIT_STATE.set(_STATE_VALUE[state])
+
+    def allow(self) -> bool:
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.reset_seconds:
+                return False
+            self._set_state(STATE_HALF_OPEN)
+        if self.state == STATE_HALF_OPEN:
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def abandon(self) -> None:
+        """Lời gọi đã được allow() nhưng không thực hiện (vd: hết slot)."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        self._set_state(STATE_CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self.state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._set_state(STATE_OPEN)
+
+
+class AIGateway:
+    """
+    Cổng gọi chat completions dùng chung cho mọi lời gọi AI (trả lời chat, kiểm tra từ):
+      - 1 httpx.AsyncClient keep-alive (pool kết nối, không bắt tay TLS lại mỗi lần)
+      - deadline riêng cho từng lời gọi (tính cả thời gian chờ slot)
+      - tối đa max_inflight lời gọi đồng thời; hết slot trong deadline -> lỗi ngay
+      - circuit breaker: upstream lỗi/timeout liên tục thì từ chối ngay thay vì xếp hàng
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = DEFAULT_BASE_URL,
+        *,
+        max_inflight: int = AI_MAX_INFLIGHT,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_inflight = max_inflight
+        self.breaker = breaker or CircuitBreaker(AI_BREAKER_FAILURES, AI_BREAKER_RESET_SECONDS)
+        self._slots = asyncio.Semaphore(max_inflight)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _http(self) -> httpx.AsyncClient:
+        # Tạo lười trong event loop đang chạy; dùng lại cho mọi lời gọi sau
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                limits=httpx.Limits(
+                    max_connections=self.max_inflight,
+                    max_keepalive_connections=self.max_inflight,
+                    keepalive_expiry=60,
+                ),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def chat(
+        self,
+        messages: List[Dict[str, str]],
+        *,
+        model: str,
+        temperature: float = 0.6,
+        max_tokens: int = 256,
+        deadline: float = 15.0,
+    ) -> str:
+        """Nội dung câu trả lời đầu tiên; lỗi bất kỳ -> AIGatewayError."""
+        if not self.configured:
+            raise AIGatewayError("Thiếu OPEN_AI key")
+        if not self.breaker.allow():
+            AI_CALLS_COUNTER.labels(endpoint_status="circuit_open").inc()
+            raise CircuitOpenError("AI upstream đang lỗi, tạm ngưng gọi")
+
+        # Mọi lối ra (kể cả huỷ, lỗi lạ) đều phải ghi nhận kết quả hoặc trả lại lượt thử
+        # half_open, nếu không breaker sẽ kẹt ở half_open và từ chối mãi mãi
+        recorded = False
+        try:
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=deadline)
+            except asyncio.TimeoutError:
+                AI_CALLS_COUNTER.labels(endpoint_status="overloaded").inc()
+                raise AIGatewayError(f"Quá {self.max_inflight} lời gọi AI đang chờ")
+            try:
+                remaining = max(0.1, deadline - (time.monotonic() - started))
+                response = await asyncio.wait_for(
+                    self._http().post(
+                        "/chat/completions",
+                        json={
+                            "model": model,
+                            "messages": messages,
+                            "temperature": temperature,
+                            "max_tokens": max_tokens,
+                        },
+                        timeout=remaining,
+                    ),
+                    timeout=remaining,
+                )
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise AIGatewayError(f"AI upstream HTTP {response.status_code}")
+                if response.status_code >= 400:
+                    raise AIRequestError(f"AI request HTTP {response.status_code}: {response.text[:200]}")
+                content = response.json()["choices"][0]["message"]["content"]
+            except AIRequestError:
+                # Lỗi phía request (key sai, payload sai): upstream vẫn sống, không mở circuit
+                self.breaker.record_success()
+                recorded = True
+                AI_CALLS_COUNTER.labels(endpoint_status="failure").inc()
+                raise
+            except AIGatewayError:
+                self.breaker.record_failure()
+                recorded = True
+                AI_CALLS_COUNTER.labels(endpoint_status="failure").inc()
+                raise
+            except Exception as e:
+                # Timeout, lỗi mạng, JSON hỏng/thiếu trường ("choices": null -> TypeError)...
+                self.breaker.record_failure()
+                recorded = True
+                AI_CALLS_COUNTER.labels(endpoint_status="failure").inc()
+                raise AIGatewayError(f"Lỗi gọi AI: {e!r}") from e
+            finally:
+                self._slots.release()
+
+            self.breaker.record_success()
+            recorded = True
+            AI_CALLS_COUNTER.labels(endpoint_status="success").inc()
+            return (content or "").strip()
+        finally:
+            if not recorded:
+                self.breaker.abandon()
+
+
+gateway = AIGateway(OPEN_AI, OPENAI_BASE_URL or DEFAULT_BASE_URL)
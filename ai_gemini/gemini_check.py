@@ -1,16 +1,13 @@
 import os
 import discord
-import requests  # Thư viện cần thiết để gọi Yescale/OpenAI API
 import time
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 import asyncio
 import json
 import re
 
-# Lấy biến môi trường cho Yescale/OpenAI
-OPEN_AI: str = os.getenv("OPEN_AI", "")
-# Lấy base URL từ .env (đã xác nhận là Yescale), default về OpenAI nếu cần
-OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+# Gọi Yescale/OpenAI qua cổng chung (kết nối keep-alive, deadline, circuit breaker)
+from ai_gemini.ai_gateway import gateway
 
 
 # FIX: Hàm lọc an toàn, thay thế MỌI ký tự @ bằng #
@@ -23,20 +20,23 @@ def filter_all_at_symbols(text: str) -> str:
     return text
 
 
-async def generate_bot_reply(user_message: discord.Message) -> str:
+async def generate_bot_reply(user_message: discord.Message, original_content: Optional[str] = None) -> str:
     """
     Tạo ra một câu trả lời hài hước, chuẩn GenZ khi người dùng reply bot.
+    original_content: nội dung tin gốc của bot nếu đã biết (khỏi fetch lại qua REST).
     """
-    if not OPEN_AI or not user_message.reference:
+    if not gateway.configured or not user_message.reference:
         # Nếu khóa API không tồn tại, trả về lỗi mặc định
         return "Bot lag rùi, đợi xíu nha :>"
 
     try:
-        # Lấy tin nhắn gốc mà người dùng đã reply
-        original_message = await user_message.channel.fetch_message(
-            user_message.reference.message_id
-        )
-        original_content = original_message.content or "Tin nhắn này không có chữ"
+        # Lấy tin nhắn gốc mà người dùng đã reply (chỉ fetch khi chưa có sẵn)
+        if original_content is None:
+            original_message = await user_message.channel.fetch_message(
+                user_message.reference.message_id
+            )
+            original_content = original_message.content
+        original_content = original_content or "Tin nhắn này không có chữ"
         print(original_content)
         user_content = user_message.content
 
@@ -68,29 +68,14 @@ NGỮ CẢNH
 HÃY TRẢ LỜI NGAY: một đoạn 2-3 câu, đúng phong cách Bảo Bối Thần Kỳ, không liệt kê, không tùy chọn. Chửi tục cũng được
         """
 
-        headers = {
-            "Authorization": f"Bearer {OPEN_AI}",
-            "Content-Type": "application/json"
-        }
-
-        # Sử dụng mô hình chuẩn OPENAI/YESCALE GPT-3.5
-        payload = {
-            "model": "gpt-4o",
-            "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 200,
-            "temperature": 0.95
-        }
-
-        # Gọi API (Dùng asyncio.to_thread vì requests là blocking)
-        def blocking_api_call():
-            # URL phải là /v1/chat/completions (hoặc tương đương)
-            return requests.post(f"{OPENAI_BASE_URL}/chat/completions", headers=headers, json=payload, timeout=15)
-
-        response = await asyncio.to_thread(blocking_api_call)
-        response.raise_for_status()  # Raise exception cho lỗi HTTP
-
-        response_data = response.json()
-        raw_output = response_data['choices'][0]['message']['content'].strip()
+        # Sử dụng mô hình chuẩn OPENAI/YESCALE GPT-4o; lỗi/timeout -> AIGatewayError
+        raw_output = await gateway.chat(
+            [{"role": "user", "content": prompt}],
+            model="gpt-4o",
+            temperature=0.95,
+            max_tokens=200,
+            deadline=15.0,
+        )
 
         # DEBUG LOG: Hiển thị đầu ra thô từ AI (trước khi lọc)
         print(f"DEBUG_AI_RAW: {raw_output}")
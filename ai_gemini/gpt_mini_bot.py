@@ -1,96 +1,72 @@
 import os
 import discord
 import asyncio
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional
 import json
 import re
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletion
 
 # Lấy cấu hình từ noitu_bot.config
-from noitu_bot.config import OPEN_AI, OPENAI_BASE_URL
+from noitu_bot.config import AI_BATCH_WINDOW_MS, AI_BATCH_MAX_WORDS
+# Mọi lời gọi AI đi qua cổng chung (keep-alive, deadline, circuit breaker, đếm metric)
+from ai_gemini.ai_gateway import gateway, AIGatewayError
 
-# START FIX: IMPORTS VÀ FALLBACK CHO MONITORING METRICS
-try:
-    from noitu_bot.monitoring_server import AI_CALLS_COUNTER
-except ImportError:
-    # Fallback nếu monitoring server chưa được cài đặt
-    print("Warning: Could not import monitoring metrics. Running without Prometheus.")
-
-
-    class DummyCounter:
-        def labels(self, *args, **kwargs):
-            return self
-
-        def inc(self):
-            pass
-
-
-    AI_CALLS_COUNTER = DummyCounter()
-# END FIX
-
-# Thiết lập Client OpenAI
-if OPENAI_BASE_URL:
-    print(f"Khởi tạo OpenAI Client với base_url: {OPENAI_BASE_URL}")
-    client = AsyncOpenAI(
-        api_key=OPEN_AI,
-        base_url=OPENAI_BASE_URL
-    )
-elif OPEN_AI:
-    print("Khởi tạo OpenAI Client với base_url mặc định.")
-    client = AsyncOpenAI(api_key=OPEN_AI)
+if gateway.configured:
+    print(f"DEBUG: W-Lex sử dụng Endpoint API: {gateway.base_url}")
 else:
     print("LỖI: Thiếu cả OPEN_AI key.")
-    client = None
-
-# DÒNG DEBUG ENDPOINT ĐÃ CÓ
-if client:
-    print(f"DEBUG: W-Lex sử dụng Endpoint API: {client.base_url}")
-# KẾT THÚC DÒNG DEBUG
 
 # Mô hình bạn muốn sử dụng (thay thế cho Gemini)
 AI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
 
-async def _generate_completion(prompt: str) -> str:
-    """Hàm wrapper gọi API completion."""
-    if not client:
+PERSONA = "Bạn là Cơm Áo Gạo Tiền – AI ngầu lòi, cà khịa duyên dáng của server Cơm Áo Gạo Tiền."
+
+
+async def _generate_completion(
+        prompt: str,
+        raise_errors: bool = False,
+        *,
+        system: str = PERSONA,
+        temperature: float = 0.6,
+        max_tokens: int = 256,
+        deadline: float = 15.0,
+) -> str:
+    """Hàm wrapper gọi API completion. raise_errors=True: ném lỗi thay vì trả câu xin lỗi."""
+    if not gateway.configured:
+        if raise_errors:
+            raise AIGatewayError("OpenAI client chưa được cấu hình")
         return "Bot bị lỗi cấu hình AI. Thiếu key hoặc endpoint."
 
     try:
-        response: ChatCompletion = await client.chat.completions.create(
-            model=AI_MODEL,
-            messages=[
-                {"role": "system", "content": "Bạn là Cơm Áo Gạo Tiền – AI ngầu lòi, cà khịa duyên dáng của server Cơm Áo Gạo Tiền."},
+        return await gateway.chat(
+            [
+                {"role": "system", "content": system},
                 {"role": "user", "content": prompt}
             ],
-            temperature=0.6,
-            max_tokens=256,
+            model=AI_MODEL,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            deadline=deadline,
         )
-
-        # LOGIC MỚI: Tăng metric SUCCESS
-        AI_CALLS_COUNTER.labels(endpoint_status='success').inc()
-
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-
-        # LOGIC MỚI: Tăng metric FAILURE
-        AI_CALLS_COUNTER.labels(endpoint_status='failure').inc()
-
+    except AIGatewayError as e:
         print(f"Lỗi khi gọi OpenAI API: {e}")
+        if raise_errors:
+            raise
         return "Á, bot bị úng nước rùi, cứu tuiii!"
 
 
-async def gpt_generate_bot_reply(user_message: discord.Message) -> str:
+async def gpt_generate_bot_reply(user_message: discord.Message, original_content: Optional[str] = None) -> str:
     """Tạo ra một câu trả lời hài hước, chuẩn GenZ khi người dùng reply bot."""
-    if not client or not user_message.reference:
+    if not gateway.configured or not user_message.reference:
         return "Bot lag rùi, đợi xíu nha :>"
 
     try:
-        original_message = await user_message.channel.fetch_message(
-            user_message.reference.message_id
-        )
-        original_content = original_message.content or "Tin nhắn này không có chữ"
+        if original_content is None:
+            original_message = await user_message.channel.fetch_message(
+                user_message.reference.message_id
+            )
+            original_content = original_message.content
+        original_content = original_content or "Tin nhắn này không có chữ"
         user_content = user_message.content
 
         # Prompt gốc đã được tối ưu hóa
@@ -112,21 +88,123 @@ async def gpt_generate_bot_reply(user_message: discord.Message) -> str:
         return "Á, bot bị úng nước rùi, cứu tuiii!"
 
 
-async def check_vietnamese_word(word: str) -> str:
+VALIDATOR_SYSTEM = "Bạn là một AI ngôn ngữ cao cấp, chỉ có một nhiệm vụ: xác nhận từ tiếng Việt."
+
+
+# Cặp "số thứ tự": giá trị trong object JSON; đọc từng cặp nên câu trả lời bị cắt giữa chừng
+# vẫn giữ được các verdict đã trả về đầy đủ
+_VERDICT_PAIR = re.compile(r'"?(\d+)"?\s*:\s*("?)(true|false|có|không|yes|no)\2', re.I)
+
+
+def _parse_verdicts(text: str, words: List[str]) -> Dict[str, str]:
+    """Đọc {"1": true, "2": false, ...} (theo số thứ tự trong danh sách); cặp thiếu hoặc sai bị bỏ qua."""
+    verdicts: Dict[str, str] = {}
+    for idx, _, value in _VERDICT_PAIR.findall(text):
+        i = int(idx) - 1
+        if 0 <= i < len(words):
+            verdicts[words[i]] = "có" if value.lower() in ("true", "có", "yes") else "không"
+    if not verdicts and words:
+        raise ValueError(f"AI không trả về JSON hợp lệ: {text[:200]!r}")
+    return verdicts
+
+
+async def check_vietnamese_words(words: List[str]) -> Dict[str, str]:
     """
-    Kiểm tra một từ tiếng Việt có tồn tại hay không (thay thế cho check_vietnamese_word gốc).
-    Verdict: 'có' hoặc 'không'
+    Kiểm tra nhiều từ trong MỘT lời gọi API (đầu ra JSON theo số thứ tự, không lặp lại từ).
+    Verdict mỗi từ: 'có' hoặc 'không'. Từ AI bỏ sót sẽ không có trong kết quả.
     """
+    listing = "\n".join(f"{i}. {w}" for i, w in enumerate(words, 1))
     prompt = f"""
-      Bạn là một AI ngôn ngữ cao cấp, chỉ có một nhiệm vụ: xác nhận từ tiếng Việt.
+      Với MỖI từ trong danh sách đánh số dưới đây, xác định nó có phải là một từ có nghĩa trong tiếng Việt không.
       RÀNG BUỘC ĐẦU RA:
-      - Chỉ trả lời MỘT từ duy nhất: "có" nếu từ "{word}" là một từ có nghĩa trong tiếng Việt.
-      - Trả lời "không" nếu từ đó vô nghĩa hoặc không tồn tại.
-      - KHÔNG giải thích, KHÔNG thêm bất kỳ ký tự nào khác.
+      - Chỉ trả về MỘT object JSON, khoá là SỐ THỨ TỰ của từ (dạng chuỗi, vd "1"), giá trị là true (có nghĩa) hoặc false (vô nghĩa / không tồn tại).
+      - KHÔNG lặp lại các từ, KHÔNG giải thích, KHÔNG thêm bất kỳ ký tự nào ngoài JSON.
 
-      Từ cần kiểm tra: "{word}"
+      Danh sách từ:
+{listing}
       """
+    response_text = await _generate_completion(
+        prompt,
+        raise_errors=True,
+        system=VALIDATOR_SYSTEM,
+        temperature=0,
+        # ~6 token mỗi cặp "12": false, ; dư gấp đôi cho chắc
+        max_tokens=64 + 12 * len(words),
+        deadline=10.0,
+    )
+    return _parse_verdicts(response_text, words)
+
 
-    response_text = await _generate_completion(prompt)
-    # Lọc lại để đảm bảo chỉ trả về 'có' hoặc 'không'
-    return "có" if "có" in response_text.lower() else "không"
\ No newline at end of file
+class BatchingWordValidator:
+    """
+    Gom các từ cần kiểm tra trong window_seconds (hoặc tới max_words từ) rồi hỏi AI 1 lần
+    bằng check_vietnamese_words, sau đó trả verdict về đúng từng lời gọi check() đang chờ.
+    Từ trùng trong cùng lô chỉ được hỏi 1 lần.
+    Rate limiter (nếu có) tính 1 lượt cho mỗi lô gửi đi; bị giới hạn thì cả lô nhận None.
+    """
+
+    def __init__(self, window_seconds: float, max_words: int, limiter=None):
+        self.window_seconds = window_seconds
+        self.max_words = max_words
+        self.limiter = limiter
+        self._pending: Dict[str, List[asyncio.Future]] = {}
+        self._timer: asyncio.TimerHandle | None = None
+
+    async def check(self, word: str) -> Optional[str]:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(word, []).append(fut)
+        if len(self._pending) >= self.max_words:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_seconds, self._dispatch)
+        return await fut
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            asyncio.create_task(self._run(batch))
+
+    async def _run(self, batch: Dict[str, List[asyncio.Future]]) -> None:
+        try:
+            if self.limiter is not None and await self.limiter.is_limited():
+                for futs in batch.values():
+                    for fut in futs:
+                        if not fut.done():
+                            fut.set_result(None)
+                return
+            verdicts = await check_vietnamese_words(list(batch))
+        except Exception as e:
+            for futs in batch.values():
+                for fut in futs:
+                    if not fut.done():
+                        fut.set_exception(e)
+            return
+        for word, futs in batch.items():
+            verdict = verdicts.get(word)
+            for fut in futs:
+                if fut.done():
+                    continue
+                if verdict is None:
+                    fut.set_exception(ValueError(f"AI không trả verdict cho '{word}'"))
+                else:
+                    fut.set_result(verdict)
+
+
+_validator = BatchingWordValidator(AI_BATCH_WINDOW_MS / 1000, AI_BATCH_MAX_WORDS)
+
+
+def set_word_check_limiter(limiter) -> None:
+    """Hạn mức gọi AI kiểm tra từ, tính theo số request (mỗi lô 1 lượt) chứ không theo số từ."""
+    _validator.limiter = limiter
+
+
+async def check_vietnamese_word(word: str) -> Optional[str]:
+    """
+    Kiểm tra một từ tiếng Việt có tồn tại hay không.
+    Verdict: 'có' hoặc 'không'; None nếu lô chứa từ này bị rate limit.
+    Các lời gọi gần nhau được gom thành 1 request (xem BatchingWordValidator).
+    """
+    return await _validator.check(word.strip().lower())
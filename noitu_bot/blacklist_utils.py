@@ -1,5 +1,6 @@
 # blacklist_utils.py
 import os
+import asyncio
 from typing import List, Optional
 from .redis_keys import K_BLACKLIST
 
@@ -26,7 +27,7 @@ async def load_blacklist_to_redis(redis, file_path: str = "words/blacklist.txt")
     global _BLACKLIST_LOADED
     if _BLACKLIST_LOADED:
         return 0
-    words = read_blacklist_file(file_path)
+    words = await asyncio.to_thread(read_blacklist_file, file_path)
     if not words:
         _BLACKLIST_LOADED = True
         return 0
@@ -36,18 +37,18 @@ async def load_blacklist_to_redis(redis, file_path: str = "words/blacklist.txt")
             pipe = redis.pipeline()
             for word in words:
                 pipe.sadd(K_BLACKLIST(), word)
-            results = pipe.execute()
+            results = await pipe.execute()
             added_count = sum(1 for r in results if r == 1)
         else:
             for word in words:
-                added_count += 1 if redis.sadd(K_BLACKLIST(), word) == 1 else 0
+                added_count += 1 if await redis.sadd(K_BLACKLIST(), word) == 1 else 0
     finally:
         _BLACKLIST_LOADED = True
     return added_count
 
 
-def is_in_blacklist(redis, word: str) -> bool:
-    return bool(redis.sismember(K_BLACKLIST(), normalize_word(word)))
+async def is_in_blacklist(redis, word: str) -> bool:
+    return bool(await redis.sismember(K_BLACKLIST(), normalize_word(word)))
 
 
 def append_word_to_file_if_missing(
@@ -69,10 +70,10 @@ def append_word_to_file_if_missing(
     return False
 
 
-def add_to_blacklist(redis, word: str, file_path: str = "words/blacklist.txt") -> dict:
+async def add_to_blacklist(redis, word: str, file_path: str = "words/blacklist.txt") -> dict:
     word_norm = normalize_word(word)
-    redis_added = int(redis.sadd(K_BLACKLIST(), word_norm)) == 1
-    file_added = append_word_to_file_if_missing(word_norm, file_path)
+    redis_added = int(await redis.sadd(K_BLACKLIST(), word_norm)) == 1
+    file_added = await asyncio.to_thread(append_word_to_file_if_missing, word_norm, file_path)
     return {"redis_added": redis_added, "file_added": file_added}
 
 
@@ -9,25 +9,29 @@ import asyncio
 from discord.utils import get
 from discord.ext import tasks
 from discord import app_commands
-from redis import Redis
 from .config import (
     DISCORD_TOKEN,
-    CHANNEL_ID,
+    GAME_CHANNEL_IDS,
     DICT_PATH,
+    DICT_JOURNAL_PATH,
     GUILD_ID,
-    REDIS_HOST,
-    REDIS_PORT,
-    REDIS_DB,
-    REDIS_DECODE,
     CHAT_CHANNEL_IDS,
     CHAT_ROLE_ID,
     ROLE_ID,
     Fail_Limit,
+    REFEREE_ENGINE,
+    ATTEMPT_FLUSH_SECONDS,
+    AI_RATE_LIMIT_CALLS,
+    AI_RATE_LIMIT_PERIOD,
+    RATE_LIMIT_MODE,
+    CHAT_REPLY_CONCURRENCY,
+    CHAT_REPLY_QUEUE,
+    IDLE_REMINDER_SECONDS,
 )
 
 # FIX: Sửa import để gọi chính xác hàm generate_bot_reply từ gemini_check.py
 try:
-    from ai_gemini.gpt_mini_bot import check_vietnamese_word
+    from ai_gemini.gpt_mini_bot import check_vietnamese_word, set_word_check_limiter
 except ImportError:
     logging.warning("Không tìm thấy hàm check_vietnamese_word.")
 
@@ -35,6 +39,10 @@ except ImportError:
     async def check_vietnamese_word(*args, **kwargs):
         return "không"
 
+
+    def set_word_check_limiter(*args, **kwargs):
+        pass
+
 try:
     from ai_gemini.gemini_check import generate_bot_reply as gpt_generate_bot_reply
 except ImportError:
@@ -64,11 +72,18 @@ except ImportError:
     REDIS_HITS_GAUGE = DummyGauge()
 # END FIX
 
-from .dict_bootstrap import bootstrap_dictionary_by_token_exact, read_words_from_file
-from .referee import WordChainRefereeByLastWordExact
+from .dict_bootstrap import sync_dictionary_with_journal
+from .dictionary import current_ns_async
+from .redis_client import create_async_redis, create_sync_redis
+from .games import GameRegistry
+from .dict_journal import DictJournal
+from .verdict_cache import VerdictCache
+from .suggest import SuggestionIndex, HintThrottle, load_from_redis
+from .reply_scheduler import ReplyScheduler
+from .message_cache import BotMessageCache, GameMessageRing
+from .idle_scheduler import IdleScheduler
 from .redis_keys import (
     K_PAUSED,
-    K_LAST_USER,
     K_DICT,
     K_TOKEN_IDX,
     K_REMAIN,
@@ -79,13 +94,12 @@ from .redis_keys import (
 from .commands import NoituSlash
 from .leaderboard_json import (
     record_win_json,
-    get_leaderboard_json,
-    # FIX: Đã sửa lỗi typo (bỏ "caster")
-    format_leaderboard_embed,
+    get_leaderboard_embed,
     record_word_attempt_json,
+    flush_word_attempts,
 )
-from .utils_vi import norm_phrase, first_token, last_token
-from .word_react import spawn_word_react_task, add_word_to_dictionary
+from .utils_vi import norm_phrase, first_token, last_token, is_plausible_phrase
+from .word_react import spawn_word_react_task, add_word_to_dictionary, ModeratorCache
 from .ratelimit import RateLimiter
 from typing import Optional
 from .blacklist_utils import (
@@ -96,19 +110,37 @@ from .blacklist_utils import (
 )
 
 is_checkspell = os.getenv("IS_CHECKSPELL", True)
-ai_rate_limiter = RateLimiter(max_calls=50, period_seconds=60)
 
 user_cooldowns = {}
 COOLDOWN_SECONDS = 30
 
+REMINDER_PREFIX = "💡 Từ hiện tại là:"
+
 EMOJI_PATTERN = re.compile(r"^(\s*(<a?:\w+:\d+>|[\U0001F000-\U0001FAFF]))+\s*$")
 
 
-async def handle_invalid_word(redis_client, input_word: str, ref, chanel):
-    if await ai_rate_limiter.is_limited():
-        print(f"Rate limit đã đạt, bỏ qua kiểm tra từ: '{input_word}'")
-        return
+class NoituClient(discord.Client):
+    """Client của bot: dừng task hẹn giờ nhắc (IdleScheduler) trước khi đóng kết nối."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reminders: Optional[IdleScheduler] = None
 
+    async def close(self) -> None:
+        if self.reminders is not None:
+            self.reminders.stop()
+        await super().close()
+
+
+async def _send_did_you_mean(message: discord.Message, near):
+    hint = " / ".join(f"**{phrase}**" for phrase, _ in near)
+    try:
+        await message.reply(f"💡 Ý bạn là: {hint}?", mention_author=False)
+    except discord.HTTPException as e:
+        logging.warning(f"Không gửi được gợi ý: {e}")
+
+
+async def handle_invalid_word(redis_client, input_word: str, games, journal, suggestions, verdicts, chanel):
     await ensure_blacklist_loaded(redis_client, "words/blacklist.txt")
 
     normalized_word = normalize_word(input_word)
@@ -116,23 +148,40 @@ async def handle_invalid_word(redis_client, input_word: str, ref, chanel):
         return
 
     try:
-        if is_in_blacklist(redis_client, normalized_word):
+        if await is_in_blacklist(redis_client, normalized_word):
             print(f"[BLACKLIST] Bỏ qua '{normalized_word}' (đã trong blacklist).")
             return
     except Exception as ex:
         print(f"[BLACKLIST] Lỗi khi kiểm tra: {ex}")
         return
 
+    # Sai cấu trúc âm tiết tiếng Việt -> chắc chắn không phải từ: blacklist luôn, không hỏi AI
+    if not is_plausible_phrase(normalized_word):
+        try:
+            await add_to_blacklist(redis_client, normalized_word, "words/blacklist.txt")
+            print(f"[PRE-FILTER] '{normalized_word}' không phải âm tiết tiếng Việt, đã blacklist")
+        except Exception as ex:
+            print(f"[BLACKLIST] Lỗi khi thêm '{normalized_word}': {ex}")
+        return
+
     try:
-        verdict = await check_vietnamese_word(normalized_word)
+        # Cache + gộp các lượt kiểm tra trùng từ; rate limit tính theo từng lô gửi AI
+        verdict = await verdicts.check(normalized_word)
     except Exception as ex:
         print(f"[CHECK WORD] Lỗi gọi AI: {ex}")
         return
+    if verdict is None:
+        print(f"Rate limit đã đạt, bỏ qua kiểm tra từ: '{input_word}'")
+        return
 
     if verdict == "có":
         try:
-            is_added = add_word_to_dictionary(
-                r=redis_client, phrase=input_word, ref=ref
+            is_added = await add_word_to_dictionary(
+                r=redis_client,
+                phrase=input_word,
+                games=games,
+                journal=journal,
+                suggestions=suggestions,
             )
             if is_added:
                 await chanel.send(
@@ -142,7 +191,7 @@ async def handle_invalid_word(redis_client, input_word: str, ref, chanel):
             print(f"[DICT] Lỗi khi thêm '{normalized_word}' vào {K_DICT()}: {ex}")
     else:
         try:
-            added = add_to_blacklist(
+            added = await add_to_blacklist(
                 redis_client, normalized_word, "words/blacklist.txt"
             )
             if added.get("redis_added") or added.get("file_added"):
@@ -153,21 +202,45 @@ async def handle_invalid_word(redis_client, input_word: str, ref, chanel):
             print(f"[BLACKLIST] Lỗi khi thêm '{normalized_word}': {ex}")
 
 
-def game_id_for_channel(channel_id: int) -> str:
-    return f"channel:{channel_id}"
-
-
 def run():
     if not DISCORD_TOKEN or DISCORD_TOKEN == "YOUR_BOT_TOKEN":
         raise RuntimeError("Please set DISCORD_TOKEN environment variable.")
-    if not CHANNEL_ID:
-        raise RuntimeError("Please set CHANNEL_ID environment variable.")
-
-    r = Redis(
-        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=REDIS_DECODE
+    if not GAME_CHANNEL_IDS:
+        raise RuntimeError("Please set CHANNEL_ID or GAME_CHANNEL_IDS environment variable.")
+
+    # Mọi xử lý trên event loop dùng client async (pool chung); client sync chỉ dùng
+    # cho đồng bộ từ điển chạy trong thread riêng
+    r = create_async_redis()
+    r_sync = create_sync_redis()
+    games = GameRegistry(r, GAME_CHANNEL_IDS)
+    journal = DictJournal(DICT_PATH, DICT_JOURNAL_PATH)
+    # Hạn mức gọi AI nằm trong Redis: mọi instance bot dùng chung 1 ngân sách,
+    # tính 1 lượt cho mỗi request gửi AI (1 lô nhiều từ), không phải cho mỗi từ
+    ai_rate_limiter = RateLimiter(
+        AI_RATE_LIMIT_CALLS, AI_RATE_LIMIT_PERIOD, mode=RATE_LIMIT_MODE, r=r, name="ai"
+    )
+    set_word_check_limiter(ai_rate_limiter)
+    verdicts = VerdictCache(r, check_vietnamese_word)
+    suggestions = SuggestionIndex()
+    hints = HintThrottle()
+    # Tin bot vừa gửi: trả lời "reply này có phải cho bot không" mà không cần fetch_message
+    sent_messages = BotMessageCache()
+    # Reaction ❤️/❌: role quản lý (TTL) và nội dung tin gần đây trong kênh game, tránh REST
+    moderators = ModeratorCache(ROLE_ID)
+    recent_messages = GameMessageRing()
+    # on_ready chạy lại sau mỗi lần gateway reconnect: phần nạp dữ liệu chỉ chạy 1 lần
+    setup_started = False
+
+    async def reply_to_chat(message: discord.Message):
+        original_content = sent_messages.replied_content(message, bot.user)
+        async with message.channel.typing():
+            reply_content = await gpt_generate_bot_reply(message, original_content)
+            await message.reply(reply_content, mention_author=False)
+
+    # Trả lời chat qua hàng đợi có giới hạn (không tạo task/lời gọi AI vô hạn khi bị spam)
+    replies = ReplyScheduler(
+        reply_to_chat, max_concurrency=CHAT_REPLY_CONCURRENCY, per_channel=CHAT_REPLY_QUEUE
     )
-    gid = game_id_for_channel(CHANNEL_ID)
-    ref = WordChainRefereeByLastWordExact(r, gid)
 
     # KHỞI ĐỘNG MONITORING SERVER (HEALTHCHECK/METRICS)
     start_monitoring_server(port=8000)
@@ -178,40 +251,58 @@ def run():
     intents.guilds = True
     intents.reactions = True
     intents.message_content = True
-    bot = discord.Client(intents=intents)
+    bot = NoituClient(intents=intents)
     tree = app_commands.CommandTree(bot)
 
     # register slash group
     noitu = NoituSlash(
         name="noitu",
         description="Quản lý trò nối từ",
-        ref=ref,
-        channel_id=CHANNEL_ID,
+        games=games,
         r=r,
     )
     tree.add_command(noitu)
 
-    @tasks.loop(seconds=60)
-    async def send_last_word_reminder():
-        await bot.wait_until_ready()
-        # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-        is_paused = await asyncio.to_thread(r.get, K_PAUSED(gid))
+    async def _remind_last_word(channel_id: int):
+        game = games.get(channel_id)
+        channel = bot.get_channel(channel_id)
+        if game is None or channel is None:
+            return
+        is_paused = await r.get(K_PAUSED(game.gid))
         if is_paused == "1":
             return
-        last_word = await asyncio.to_thread(r.get, K_LAST_WORD(gid))
-        channel = bot.get_channel(CHANNEL_ID)
-
-        if channel and last_word:
+        last_word = await r.get(K_LAST_WORD(game.gid))
+        if last_word:
             try:
-                last_msgs = [msg async for msg in channel.history(limit=1)]
-                if last_msgs:
-                    last_msg = last_msgs[0]
-                    if "💡 Từ hiện tại là:" in last_msg.content:
-                        return
-                await channel.send(f"💡 Từ hiện tại là: **{last_word}**")
+                await channel.send(f"{REMINDER_PREFIX} **{last_word}**")
             except Exception as e:
                 logging.error(f"Không thể gửi tin nhắn nhắc nhở: {e}")
 
+    # Nhắc từ hiện tại khi kênh im lặng đủ lâu: hẹn giờ theo hoạt động thật trong on_message,
+    # nên không cần poll định kỳ hay đọc lịch sử kênh qua REST
+    reminders = IdleScheduler(IDLE_REMINDER_SECONDS, _remind_last_word)
+    bot.reminders = reminders  # NoituClient.close() dừng task này khi tắt bot
+
+    @tasks.loop(minutes=5)
+    async def evict_idle_games():
+        await bot.wait_until_ready()
+        games.evict_idle()
+
+    @tasks.loop(minutes=30)
+    async def compact_dict_journal():
+        await bot.wait_until_ready()
+        try:
+            await asyncio.to_thread(journal.compact_if_needed)
+        except Exception as e:
+            logging.error(f"Không thể gộp journal từ điển: {e}")
+
+    @tasks.loop(seconds=ATTEMPT_FLUSH_SECONDS)
+    async def flush_attempt_counters():
+        try:
+            await asyncio.to_thread(flush_word_attempts)
+        except Exception as e:
+            logging.error(f"Không thể ghi bộ đếm lượt đánh: {e}")
+
     # FIX: Tách logic I/O nặng ra khỏi on_ready
     async def setup_bot_data():
         """Chạy I/O nặng trong thread riêng để không block bot"""
@@ -219,36 +310,47 @@ def run():
         logging.info("Bot đã sẵn sàng. Bắt đầu nạp dữ liệu (nền)...")
 
         try:
-            # Chạy hàm blocking I/O (đọc file) trong một thread riêng
-            words = await asyncio.to_thread(read_words_from_file, DICT_PATH)
-            if not words:
-                logging.warning("File từ điển không tìm thấy hoặc rỗng: %s", DICT_PATH)
+            # Gộp journal vào file rồi đồng bộ từ điển (file + Redis I/O) trong thread,
+            # giữ lock journal suốt quá trình; bỏ qua nếu file không đổi
+            if not DICT_PATH.exists():
+                logging.warning("File từ điển không tìm thấy: %s", DICT_PATH)
             else:
-                # Chạy hàm bootstrap (Redis I/O) trong thread
-                await asyncio.to_thread(bootstrap_dictionary_by_token_exact, r, words)
-                logging.info("Nạp từ điển vào Redis thành công từ %s", DICT_PATH)
+                stats = await asyncio.to_thread(
+                    sync_dictionary_with_journal,
+                    r_sync,
+                    journal,
+                    DICT_PATH,
+                    with_ids=REFEREE_ENGINE == "bitmap",
+                )
+                logging.info("Đồng bộ từ điển từ %s: %s", DICT_PATH, stats)
+            # Index gợi ý "ý bạn là" dựng từ đúng phiên bản từ điển đang phục vụ
+            await asyncio.to_thread(load_from_redis, suggestions, r_sync)
 
             # Cập nhật metric
-            dict_size = await asyncio.to_thread(r.scard, K_DICT())
+            ns = await current_ns_async(r)
+            dict_size = await r.scard(K_DICT(ns))
             REDIS_HITS_GAUGE.set(dict_size)
             logging.info(f"Cập nhật Redis dictionary size metric: {dict_size}")
 
         except Exception as e:
             logging.exception("Nạp từ điển thất bại: %s", e)
 
-        # Bắt đầu ván mới (SAU KHI nạp từ điển)
-        ch = bot.get_channel(CHANNEL_ID)
-        if ch:
-            # ref.start_round_random() cũng là I/O, chạy trong thread
-            opening = await asyncio.to_thread(ref.start_round_random)
+        # Bắt đầu ván mới ở mọi kênh nối từ (SAU KHI nạp từ điển)
+        for channel_id in GAME_CHANNEL_IDS:
+            ch = bot.get_channel(channel_id)
+            if not ch:
+                continue
+            game = games.get(channel_id)
+            opening = await game.ref.start_round_random()
             if opening:
                 await ch.send(f"🎮 **Ván mới!** Từ mở màn: **{opening}**")
             else:
                 await ch.send("⚠️ Từ điển rỗng hoặc chưa nạp từ điển.")
-        logging.info("Đã tham gia kênh %s", CHANNEL_ID)
+            logging.info("Đã tham gia kênh %s", channel_id)
 
     @bot.event
     async def on_ready():
+        nonlocal setup_started
         logging.info("Bot ready as %s", bot.user)
         try:
             if GUILD_ID:
@@ -262,23 +364,43 @@ def run():
 
         # FIX: Kích hoạt task nền để nạp dữ liệu
         # Điều này giải phóng on_ready, cho phép bot nhận lệnh ngay
-        bot.loop.create_task(setup_bot_data())
-
-        if not send_last_word_reminder.is_running():
-            send_last_word_reminder.start()
+        if not setup_started:
+            setup_started = True
+            bot.loop.create_task(setup_bot_data())
+
+        reminders.start()
+        if not evict_idle_games.is_running():
+            evict_idle_games.start()
+        if not compact_dict_journal.is_running():
+            compact_dict_journal.start()
+        if not flush_attempt_counters.is_running():
+            flush_attempt_counters.start()
 
     @bot.event
     async def on_message(message: discord.Message):
         is_chat_channel = message.channel.id in CHAT_CHANNEL_IDS
-        is_game_channel = message.channel.id == CHANNEL_ID
+        is_game_channel = games.is_game_channel(message.channel.id)
+
+        if bot.user and message.author.id == bot.user.id:
+            sent_messages.remember(message)
+            # Tin nhắc của chính bot không tính là hoạt động (chỉ nhắc 1 lần mỗi lần im lặng)
+            if games.is_game_channel(message.channel.id) and not message.content.startswith(REMINDER_PREFIX):
+                reminders.touch(message.channel.id)
+            return
 
         if message.author.bot or (not is_chat_channel and not is_game_channel):
             return
 
+        if is_game_channel:
+            reminders.touch(message.channel.id)
+
         content = message.content.strip()
         if not content:
             return
 
+        if is_game_channel:
+            recent_messages.put(message.channel.id, message.id, content)
+
         if message.stickers:
             return
 
@@ -286,23 +408,11 @@ def run():
             return
 
         # START: LOGIC XỬ LÝ CHATBOT REPLY (Cà khịa)
-        if message.reference:
-            try:
-                replied_to = await message.channel.fetch_message(
-                    message.reference.message_id
-                )
-                if replied_to.author == bot.user and is_chat_channel:
-                    async def thinking_and_replying():
-                        async with message.channel.typing():
-                            reply_content = await gpt_generate_bot_reply(message)
-                            await message.reply(reply_content, mention_author=False)
-
-                    bot.loop.create_task(thinking_and_replying())
-                    return
-            except discord.NotFound:
-                pass
-            except Exception as e:
-                print(f"Lỗi khi xử lý tin nhắn reply: {e}")
+        # Tin gốc lấy từ dữ liệu gateway gửi kèm hoặc LRU tin bot đã gửi, không gọi REST
+        if message.reference and is_chat_channel:
+            if sent_messages.replied_content(message, bot.user) is not None:
+                replies.submit(message)
+                return
         # END: LOGIC XỬ LÝ CHATBOT REPLY
 
         # KHỐI LOGIC CHỈ DÀNH CHO GAME NỐI TỪ
@@ -312,28 +422,30 @@ def run():
         if len(content.split()) != 2:
             return
 
-        # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-        last_user = await asyncio.to_thread(r.get, K_LAST_USER(ref.gid))
-        if last_user and last_user != "BOT" and last_user == str(message.author.id):
+        game = games.get(message.channel.id)
+        ref = game.ref
+
+        res = await game.submit(str(message.author.id), content)
+
+        # Vừa nối từ trước đó: chờ người khác (script chấm kiểm tra theo thứ tự của actor)
+        if res["msg"] == "SAME_USER":
             try:
                 await message.add_reaction("⏳")
             except Exception:
                 pass
             return
 
-        # FIX: Wrap blocking ref.submit() in asyncio.to_thread()
-        res = await asyncio.to_thread(ref.submit, user_id=str(message.author.id), raw_phrase=content)
-
         is_correct_word = res["ok"] and res["msg"] not in ["USED", "RULE_MISMATCH"]
 
         if res["msg"] != "ENDED":
-            # FIX: Wrap blocking file I/O in asyncio.to_thread()
-            await asyncio.to_thread(
-                record_word_attempt_json,
+            # Chỉ cộng bộ đếm trong RAM; I/O ghi đĩa chỉ chạy (trong thread) khi đủ lô
+            flush_due = record_word_attempt_json(
                 user_id=str(message.author.id),
                 is_correct=is_correct_word,
                 base_dir="./data"
             )
+            if flush_due:
+                await asyncio.to_thread(flush_word_attempts, "./data")
 
         try:
             if res["ok"]:
@@ -353,9 +465,16 @@ def run():
                 emoji = "⛔"
                 print(res["msg"])
                 if res["msg"] == "NOT_IN_DICT":
-                    if is_checkspell:
+                    near = suggestions.lookup(content)
+                    # Gợi ý bị gộp/giới hạn theo kênh: gõ sai dồn dập không thành spam tin nhắn
+                    if near and await hints.allow(message.channel.id, near[0][0]):
+                        asyncio.create_task(_send_did_you_mean(message, near))
+                    # Chỉ sai dấu so với 1 từ đã có -> không phải từ mới, khỏi hỏi AI
+                    if is_checkspell and not (near and near[0][1] == 0):
                         asyncio.create_task(
-                            handle_invalid_word(r, content, ref, message.channel)
+                            handle_invalid_word(
+                                r, content, games, journal, suggestions, verdicts, message.channel
+                            )
                         )
             await message.add_reaction(emoji)
         except Exception:
@@ -382,10 +501,9 @@ def run():
                     display_name=display_name,
                     base_dir="./data",
                 )
-                top5 = await asyncio.to_thread(get_leaderboard_json, top_n=5, base_dir="./data")
-                lb_embed = format_leaderboard_embed(top5)
+                lb_embed = await get_leaderboard_embed(top_n=5, base_dir="./data")
 
-                hint = await asyncio.to_thread(ref.get_hint)
+                hint = await ref.get_hint()
                 if res["msg"] == "FAIL_LIMIT_REACHED":
                     win_announcement = (
                         f"💡 **Gợi ý:** `{hint}`"
@@ -397,8 +515,7 @@ def run():
                         f"🏁 **<@{winner_id}> thắng!** (tổng: {total_wins})"
                     )
 
-                # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-                opening = await asyncio.to_thread(ref.start_round_random)
+                opening = await ref.start_round_random()
                 if opening:
                     await message.channel.send(
                         f"{win_announcement}\n"
@@ -412,8 +529,7 @@ def run():
                         embed=lb_embed,
                     )
             else:
-                # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-                opening = await asyncio.to_thread(ref.start_round_random)
+                opening = await ref.start_round_random()
                 if opening:
                     await message.channel.send(
                         f"🔒 Ván chơi kết thúc do có quá nhiều lượt sai.\n"
@@ -427,10 +543,11 @@ def run():
         spawn_word_react_task(
             bot,
             r,
-            ref,
-            CHANNEL_ID,
-            ROLE_ID,
-            DICT_PATH,
+            games,
+            moderators,
+            journal,
+            suggestions,
+            recent_messages,
             norm_phrase,
             first_token,
             last_token,
@@ -442,4 +559,14 @@ def run():
             payload,
         )
 
-    bot.run(DISCORD_TOKEN)
\ No newline at end of file
+    @bot.event
+    async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+        # Tin đã sửa: cập nhật ring buffer để reaction đọc đúng nội dung mới
+        if games.is_game_channel(payload.channel_id) and "content" in payload.data:
+            recent_messages.put(payload.channel_id, payload.message_id, payload.data["content"])
+
+    try:
+        bot.run(DISCORD_TOKEN)
+    finally:
+        # Không để mất các lượt đánh còn trong buffer khi tắt bot
+        flush_word_attempts()
\ No newline at end of file
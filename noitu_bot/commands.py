@@ -6,17 +6,23 @@ from pathlib import Path
 from discord import app_commands
 from discord.errors import HTTPException, NotFound
 from .redis_keys import K_PAUSED, K_ENDED, K_LAST_USER
-from .referee import WordChainRefereeByLastWordExact
+from .games import GameRegistry
 from .leaderboard_json import (
     get_leaderboard_json,
-    format_leaderboard_embed,
+    get_leaderboard_embed,
     record_win_json,
+    get_stats_store,
+    PERIOD_ALL,
+    PERIOD_LABELS,
 )
 from .config import (
     ROLE_ID,
     DICT_PATH,
+    DICT_JOURNAL_PATH,
     BLACKLIST_PATH,
     LEADERBOARD_PATH,
+    STATS_DB_PATH,
+    STATS_BACKEND,
     ADMIN_USER_ID,
 )  # import role id and admin user id
 
@@ -79,13 +85,11 @@ class NoituSlash(app_commands.Group):
             name: str,
             description: str,
             *,
-            ref: WordChainRefereeByLastWordExact,
-            channel_id: int,
+            games: GameRegistry,
             r,
     ):
         super().__init__(name=name, description=description)
-        self.ref = ref
-        self.channel_id = channel_id
+        self.games = games
         self.r = r
 
     def _has_permission(self, inter: discord.Interaction) -> bool:
@@ -114,14 +118,14 @@ class NoituSlash(app_commands.Group):
                 "❌ Bạn không có quyền dùng lệnh này.", ephemeral=True
             )
             return
-        if inter.channel_id != self.channel_id:
+        game = self.games.get(inter.channel_id)
+        if game is None:
             await inter.followup.send("❌ Sai kênh.", ephemeral=True)
             return
 
         # LOGIC CHÍNH
-        # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-        await asyncio.to_thread(self.r.delete, K_PAUSED(self.ref.gid))
-        opening = await asyncio.to_thread(self.ref.start_round_random)
+        await self.r.delete(K_PAUSED(game.ref.gid))
+        opening = await game.ref.start_round_random()
         logging.info("/noitu batdau by %s -> %s", inter.user.id, opening)
 
         # Gửi kết quả (công khai)
@@ -148,12 +152,12 @@ class NoituSlash(app_commands.Group):
                 "❌ Bạn không có quyền dùng lệnh này.", ephemeral=True
             )
             return
-        if inter.channel_id != self.channel_id:
+        game = self.games.get(inter.channel_id)
+        if game is None:
             await inter.followup.send("❌ Sai kênh.", ephemeral=True)
             return
 
-        # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-        await asyncio.to_thread(self.r.set, K_PAUSED(self.ref.gid), "1")
+        await self.r.set(K_PAUSED(game.ref.gid), "1")
         logging.info("/noitu ketthuc by %s", inter.user.id)
 
         # Gửi kết quả (công khai)
@@ -177,19 +181,19 @@ class NoituSlash(app_commands.Group):
                 "❌ Bạn không có quyền dùng lệnh này.", ephemeral=True
             )
             return
-        if inter.channel_id != self.channel_id:
+        game = self.games.get(inter.channel_id)
+        if game is None:
             await inter.followup.send("❌ Sai kênh.", ephemeral=True)
             return
 
-        # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-        is_paused = await asyncio.to_thread(self.r.get, K_PAUSED(self.ref.gid))
+        is_paused = await self.r.get(K_PAUSED(game.ref.gid))
         if is_paused == "1":
             await inter.followup.send(
                 "⏸️ Đang tạm ngưng. Dùng `/noitu batdau` để tiếp tục.", ephemeral=True
             )
             return
 
-        last_uid = await asyncio.to_thread(self.r.get, K_LAST_USER(self.ref.gid))
+        last_uid = await self.r.get(K_LAST_USER(game.ref.gid))
         if not last_uid:
             await inter.followup.send("⚠️ Chưa có người chơi trước đó.", ephemeral=True)
             return
@@ -205,8 +209,7 @@ class NoituSlash(app_commands.Group):
                                       ephemeral=True)
             return
 
-        # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-        hint = await asyncio.to_thread(self.ref.get_hint)
+        hint = await game.ref.get_hint()
         if hint:
             await inter.followup.send(f"💡 **Gợi ý:** `{hint}`", ephemeral=True)
 
@@ -226,11 +229,9 @@ class NoituSlash(app_commands.Group):
             display_name=display_name,
             base_dir="./data",
         )
-        top5 = await asyncio.to_thread(get_leaderboard_json, top_n=5, base_dir="./data")
-        lb_embed = format_leaderboard_embed(top5)
+        lb_embed = await get_leaderboard_embed(top_n=5, base_dir="./data")
 
-        # FIX: Wrap blocking Redis operations in asyncio.to_thread()
-        opening = await asyncio.to_thread(self.ref.start_round_random)
+        opening = await game.ref.start_round_random()
         if opening:
             # Gửi tin nhắn công khai (dùng ephemeral=False)
             await inter.followup.send(
@@ -246,8 +247,14 @@ class NoituSlash(app_commands.Group):
             )
 
     @app_commands.command(name="bxh", description="Xem bảng xếp hạng (top 10).")
-    @app_commands.describe(solan="Số người đứng đầu muốn xem (mặc định 10, tối đa 25)")
-    async def bxh(self, inter: discord.Interaction, solan: int = 10):
+    @app_commands.describe(
+        solan="Số người đứng đầu muốn xem (mặc định 10, tối đa 25)",
+        ky="Kỳ xếp hạng (mặc định: mọi thời đại)",
+    )
+    @app_commands.choices(ky=[
+        app_commands.Choice(name=label, value=key) for key, label in PERIOD_LABELS.items()
+    ])
+    async def bxh(self, inter: discord.Interaction, solan: int = 10, ky: str = PERIOD_ALL):
         # DEFER NGAY LẬP TỨC - KHÔNG CÓ LOGIC NÀO TRƯỚC ĐÓ
         try:
             await inter.response.defer(ephemeral=False)
@@ -260,14 +267,12 @@ class NoituSlash(app_commands.Group):
                 "❌ Bạn không có quyền dùng lệnh này.", ephemeral=True
             )
             return
-        if inter.channel_id != self.channel_id:
+        if not self.games.is_game_channel(inter.channel_id):
             await inter.followup.send("❌ Sai kênh.", ephemeral=True)
             return
 
         top_n = max(1, min(25, solan))
-        # FIX: Wrap blocking file I/O in asyncio.to_thread()
-        rows = await asyncio.to_thread(get_leaderboard_json, top_n=top_n)
-        embed = format_leaderboard_embed(rows)
+        embed = await get_leaderboard_embed(top_n=top_n, period=ky)
 
         await inter.followup.send(embed=embed, ephemeral=False)
 
@@ -292,7 +297,7 @@ class NoituSlash(app_commands.Group):
         asyncio.create_task(self._backup_dm_task(inter.user))
 
     async def _backup_dm_task(self, user: discord.User):
-        files = [p for p in [DICT_PATH, LEADERBOARD_PATH, BLACKLIST_PATH] if p.exists()]
+        files = [p for p in [DICT_PATH, DICT_JOURNAL_PATH, LEADERBOARD_PATH, BLACKLIST_PATH] if p.exists()]
         if not files:
             try:
                 await user.send("❌ Không tìm thấy files cần backup.")
@@ -309,6 +314,11 @@ class NoituSlash(app_commands.Group):
                 with tarfile.open(tarpath, "w:gz") as tar:
                     for p in files:
                         tar.add(p, arcname=p.as_posix())
+                    if STATS_BACKEND == "sqlite":
+                        # Snapshot nhất quán thay vì copy file DB đang ghi (WAL)
+                        snap = Path(tmp) / STATS_DB_PATH.name
+                        await asyncio.to_thread(get_stats_store().backup_to, str(snap))
+                        tar.add(snap, arcname=STATS_DB_PATH.as_posix())
                 try:
                     await user.send(
                         content=f"✅ {fname}",
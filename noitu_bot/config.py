@@ -29,8 +29,15 @@ ADMIN_USER_ID: int = int(os.getenv("ADMIN_USER_ID", '0'))
 chat_channels_raw = os.getenv('CHAT_CHANNEL_IDS', str(CHANNEL_ID))
 CHAT_CHANNEL_IDS: list[int] = [int(i.strip()) for i in chat_channels_raw.split(',') if i.strip().isdigit()]
 
+# Các kênh chơi nối từ (mỗi kênh 1 ván riêng). Mặc định chỉ CHANNEL_ID.
+game_channels_raw = os.getenv('GAME_CHANNEL_IDS', str(CHANNEL_ID))
+GAME_CHANNEL_IDS: list[int] = [int(i.strip()) for i in game_channels_raw.split(',') if i.strip().isdigit() and int(i.strip())]
+
 DICT_PATH = Path("words/words.txt")
+# Journal thêm/xoá từ (append-only), được gộp định kỳ vào DICT_PATH
+DICT_JOURNAL_PATH = Path("words/words.journal")
 LEADERBOARD_PATH = Path("data/leaderboard.json")
+STATS_DB_PATH = Path("data/stats.sqlite3")
 BLACKLIST_PATH = Path("words/blacklist.txt")
 
 GUILD_ID: int | None = int(os.getenv("GUILD_ID")) if os.getenv("GUILD_ID") else None
@@ -39,6 +46,39 @@ REDIS_HOST: str = os.getenv("REDIS_HOST", "redis")
 REDIS_PORT: int = int(os.getenv("REDIS_PORT", "6379"))
 REDIS_DB: int = int(os.getenv("REDIS_DB", "0"))
 REDIS_DECODE: bool = True  # keep UTF-8 Vietnamese text readable
+# Số kết nối tối đa của pool async dùng chung (referee, lệnh slash, reaction...)
+REDIS_MAX_CONNECTIONS: int = int(os.getenv("REDIS_MAX_CONNECTIONS", "32"))
+
+# "set": mỗi ván copy tập từ theo token; "bitmap": ID từ + bitmap (cần Redis >= 7.0)
+REFEREE_ENGINE: str = os.getenv("REFEREE_ENGINE", "set").lower()
+
+# "sqlite": thống kê người chơi trong data/stats.sqlite3 (tự nhập leaderboard.json lần đầu);
+# "json": ghi thẳng data/leaderboard.json như cũ
+STATS_BACKEND: str = os.getenv("STATS_BACKEND", "sqlite").lower()
+# Bộ đếm lượt đánh được gom trong RAM, ghi xuống đĩa mỗi N giây hoặc N lượt
+ATTEMPT_FLUSH_SECONDS: int = int(os.getenv("ATTEMPT_FLUSH_SECONDS", "15"))
+ATTEMPT_FLUSH_EVENTS: int = int(os.getenv("ATTEMPT_FLUSH_EVENTS", "200"))
+
+# Thời gian cache kết quả AI kiểm tra từ (giây): "có" và "không" tách riêng
+AI_VERDICT_TTL_POSITIVE: int = int(os.getenv("AI_VERDICT_TTL_POSITIVE", str(30 * 24 * 3600)))
+AI_VERDICT_TTL_NEGATIVE: int = int(os.getenv("AI_VERDICT_TTL_NEGATIVE", str(7 * 24 * 3600)))
+# Gom các từ cần AI kiểm tra trong 1 cửa sổ ngắn (ms) hoặc tới N từ rồi hỏi 1 lần
+AI_BATCH_WINDOW_MS: int = int(os.getenv("AI_BATCH_WINDOW_MS", "300"))
+AI_BATCH_MAX_WORDS: int = int(os.getenv("AI_BATCH_MAX_WORDS", "20"))
+# Hạn mức gọi AI kiểm tra từ: N lần / M giây, dùng chung cho mọi process qua Redis
+# RATE_LIMIT_MODE: "sliding" (sliding log, chặt) hoặc "token" (token bucket, cho dồn)
+AI_RATE_LIMIT_CALLS: int = int(os.getenv("AI_RATE_LIMIT_CALLS", "50"))
+AI_RATE_LIMIT_PERIOD: int = int(os.getenv("AI_RATE_LIMIT_PERIOD", "60"))
+RATE_LIMIT_MODE: str = os.getenv("RATE_LIMIT_MODE", "sliding").lower()
+# Cổng gọi AI: tối đa N lời gọi đồng thời; lỗi liên tiếp N lần -> ngắt (circuit) M giây
+AI_MAX_INFLIGHT: int = int(os.getenv("AI_MAX_INFLIGHT", "8"))
+AI_BREAKER_FAILURES: int = int(os.getenv("AI_BREAKER_FAILURES", "5"))
+AI_BREAKER_RESET_SECONDS: int = int(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+# Trả lời chat: tối đa N câu trả lời đang tạo cùng lúc, mỗi kênh chờ tối đa M tin
+CHAT_REPLY_CONCURRENCY: int = int(os.getenv("CHAT_REPLY_CONCURRENCY", "4"))
+CHAT_REPLY_QUEUE: int = int(os.getenv("CHAT_REPLY_QUEUE", "5"))
+# Kênh nối từ im lặng quá N giây -> nhắc lại từ hiện tại
+IDLE_REMINDER_SECONDS: int = int(os.getenv("IDLE_REMINDER_SECONDS", "60"))
 
 
 # Minimal permissions for invite (View, Send, Add Reactions, Read History)
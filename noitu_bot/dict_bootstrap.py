@@ -1,60 +1,309 @@
-from typing import Iterable
+import hashlib
+import logging
+import time
+from typing import Iterable, Dict, Any
 from redis import Redis
-from .utils_vi import norm_phrase, first_token
-from .redis_keys import K_DICT, K_TOKEN_IDX
+from .utils_vi import phrase_tokens
+from .redis_keys import (
+    DICT_NS_DEFAULT,
+    K_DICT,
+    K_TOKEN_IDX,
+    K_LAST_IDX,
+    K_PLAYABLE,
+    K_DICT_FINGERPRINT,
+    K_DICT_CURRENT,
+    K_DICT_RETIRED,
+    K_DICT_SEQ,
+    K_DICT_NS,
+    K_WID,
+    K_WID_REV,
+    K_WID_RANGE,
+    K_WID_EXTRA,
+    K_WID_NEXT,
+    K_WID_DEAD,
+)
+from .dictionary import dict_apply_diff, current_ns
+
+try:
+    from .monitoring_server import DICT_LOAD_PROGRESS, DICT_LOAD_SECONDS
+except ImportError:
+    class DummyGauge:
+        def set(self, *args, **kwargs): pass
+
+
+    DICT_LOAD_PROGRESS = DICT_LOAD_SECONDS = DummyGauge()
+
+# Namespace cũ được giữ thêm chừng này giây sau khi đổi phiên bản (cho các lệnh đang chạy)
+RETIRED_DICT_TTL = 300
 
 def read_words_from_file(path: str) -> Iterable[str]:
     with open(path, "r", encoding="utf-8") as f:
         for line in f:
             yield line
 
+
+def _ns_keys(ns: str) -> tuple[str, ...]:
+    return (
+        K_DICT(ns),
+        K_PLAYABLE(ns),
+        K_DICT_FINGERPRINT(ns),
+        K_WID(ns),
+        K_WID_REV(ns),
+        K_WID_RANGE(ns),
+        K_WID_NEXT(ns),
+        K_WID_DEAD(ns),
+    )
+
+
+def _ns_patterns(ns: str) -> tuple[str, ...]:
+    return K_TOKEN_IDX("*", ns), K_LAST_IDX("*", ns), K_WID_EXTRA("*", ns)
+
+
+def _scan_batches(r: Redis, pattern: str) -> Iterable[list]:
+    cursor = 0
+    while True:
+        cursor, keys = r.scan(cursor=cursor, match=pattern, count=1000)
+        if keys:
+            yield keys
+        if cursor == 0:
+            break
+
+class _BulkWriter:
+    """Gom phần tử thành SADD nhiều phần tử (giới hạn theo payload) rồi đẩy qua pipeline."""
+
+    def __init__(self, r: Redis, max_members: int, max_payload: int, pipe_payload: int):
+        self.pipe = r.pipeline(transaction=False)
+        self.max_members = max_members
+        self.max_payload = max_payload
+        self.pipe_payload = pipe_payload
+        self.pending = 0
+        self.commands = 0
+        self.members = 0
+
+    def sadd(self, key: str, members: Iterable[str]) -> None:
+        chunk: list[str] = []
+        size = 0
+        for m in members:
+            n = len(m.encode("utf-8"))
+            if chunk and (len(chunk) >= self.max_members or size + n > self.max_payload):
+                self._emit(key, chunk, size)
+                chunk, size = [], 0
+            chunk.append(m)
+            size += n
+        if chunk:
+            self._emit(key, chunk, size)
+
+    def hset(self, key: str, items: Iterable[tuple[object, object]]) -> None:
+        mapping: Dict[object, object] = {}
+        size = 0
+        for k, v in items:
+            n = len(str(k).encode("utf-8")) + len(str(v).encode("utf-8"))
+            if mapping and (len(mapping) >= self.max_members or size + n > self.max_payload):
+                self._emit(key, mapping, size)
+                mapping, size = {}, 0
+            mapping[k] = v
+            size += n
+        if mapping:
+            self._emit(key, mapping, size)
+
+    def _emit(self, key: str, chunk, size: int) -> None:
+        if isinstance(chunk, dict):
+            self.pipe.hset(key, mapping=chunk)
+        else:
+            self.pipe.sadd(key, *chunk)
+        self.commands += 1
+        self.members += len(chunk)
+        self.pending += size
+        if self.pending >= self.pipe_payload:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.pending:
+            self.pipe.execute()
+            self.pending = 0
+            DICT_LOAD_PROGRESS.set(self.members)
+
+
 def bootstrap_dictionary_by_token_exact(
     r: Redis,
     words: Iterable[str],
     batch: int = 5000,
     *,
     purge_before_load: bool = True,
-) -> None:
+    ns: str = DICT_NS_DEFAULT,
+    max_payload: int = 64 * 1024,
+    pipe_payload: int = 1024 * 1024,
+    with_ids: bool = False,
+) -> Dict[str, Any]:
     """
-    Load dictionary into Redis (with diacritics), after PURGING old keys:
-      - dict:vi : all phrases (lowercase, keep accents)
-      - dict:vi:tokenx:<first_token> : phrases whose FIRST token equals <first_token> (with accents)
+    Load dictionary into Redis namespace <ns> (with diacritics), after PURGING old keys:
+      - <ns> : all phrases (lowercase, keep accents)
+      - <ns>:tokenx:<first_token> : phrases whose FIRST token equals <first_token> (with accents)
+      - <ns>:lastx:<last_token>   : phrases whose LAST token equals <last_token> (with accents)
+      - <ns>:playable             : phrases whose last token has at least one continuation
+    Nạp hàng loạt: chuẩn hoá 1 lượt, gom theo token rồi ghi bằng SADD nhiều phần tử
+    (mỗi lệnh tối đa `batch` phần tử / `max_payload` byte). Trả về thống kê lần nạp.
+    with_ids=True: cấp thêm Word-ID liên tục theo token đầu (cho engine "bitmap").
+    Không tự đổi phiên bản đang phục vụ; dùng rebuild_dictionary() để nạp kiểu blue/green.
     """
+    started = time.perf_counter()
+
     # 1) Purge old dictionary/index keys (optional but default True)
     if purge_before_load:
         # xóa tập chính
-        r.delete(K_DICT())
-        # xóa toàn bộ index theo token đầu (có dấu)
-        cursor = 0
-        pattern = "dict:vi:tokenx:*"   # vì K_TOKEN_IDX(tok) = f"dict:vi:tokenx:{tok}"
-        while True:
-            cursor, keys = r.scan(cursor=cursor, match=pattern, count=1000)
-            if keys:
+        r.delete(*_ns_keys(ns))
+        # xóa toàn bộ index theo token đầu/cuối (có dấu)
+        for pattern in _ns_patterns(ns):
+            for keys in _scan_batches(r, pattern):
                 # xóa theo batch để tránh 1 lệnh DEL quá dài
-                pipe = r.pipeline()
-                for k in keys:
-                    pipe.delete(k)
-                pipe.execute()
-            if cursor == 0:
-                break
+                r.delete(*keys)
 
-    # 2) Nạp lại từ điển + index
-    pipe = r.pipeline()
-    n = 0
+    # 2) Chuẩn hoá + gom nhóm theo token đầu/cuối (1 lượt duyệt)
+    by_first: Dict[str, list[str]] = {}
+    by_last: Dict[str, list[str]] = {}
     for raw in words:
-        phrase = norm_phrase(raw)   # lowercase + gọn khoảng trắng, GIỮ DẤU
-        if not phrase:
-            continue
-        ft = first_token(phrase)    # token đầu CÓ DẤU
+        phrase, ft, lt = phrase_tokens(raw)  # lowercase + gọn khoảng trắng, GIỮ DẤU
         if not ft:
             continue
+        by_first.setdefault(ft, []).append(phrase)
+        if lt:
+            by_last.setdefault(lt, []).append(phrase)
 
-        pipe.sadd(K_DICT(), phrase)
-        pipe.sadd(K_TOKEN_IDX(ft), phrase)
+    # 3) Ghi từ điển + index
+    DICT_LOAD_PROGRESS.set(0)
+    w = _BulkWriter(r, max_members=batch, max_payload=max_payload, pipe_payload=pipe_payload)
+    for ft, phrases in by_first.items():
+        w.sadd(K_DICT(ns), phrases)
+        w.sadd(K_TOKEN_IDX(ft, ns), phrases)
+    for lt, phrases in by_last.items():
+        w.sadd(K_LAST_IDX(lt, ns), phrases)
+        # Từ mở màn hợp lệ: token cuối phải là token đầu của ít nhất 1 từ
+        if lt in by_first:
+            w.sadd(K_PLAYABLE(ns), phrases)
+    next_id = 0
+    if with_ids:
+        ranges = []
+        for ft in sorted(by_first):
+            phrases = list(dict.fromkeys(by_first[ft]))
+            start = next_id
+            w.hset(K_WID(ns), ((p, start + i) for i, p in enumerate(phrases)))
+            w.hset(K_WID_REV(ns), ((start + i, p) for i, p in enumerate(phrases)))
+            next_id += len(phrases)
+            ranges.append((ft, f"{start} {next_id - 1}"))
+        w.hset(K_WID_RANGE(ns), ranges)
+    w.flush()
+    if with_ids:
+        # Đặt sau cùng: sự tồn tại của wid_next đánh dấu namespace đã có Word-ID đầy đủ
+        r.set(K_WID_NEXT(ns), next_id)
 
-        n += 1
-        if n % batch == 0:
-            pipe.execute()
+    elapsed = time.perf_counter() - started
+    DICT_LOAD_SECONDS.set(elapsed)
+    stats = {
+        "phrases": sum(len(v) for v in by_first.values()),
+        "tokens": len(by_first),
+        "commands": w.commands,
+        "seconds": round(elapsed, 3),
+    }
+    logging.info("Dictionary bulk load into %s: %s", ns, stats)
+    return stats
+
+
+def rebuild_dictionary(
+    r: Redis,
+    words: Iterable[str],
+    fingerprint: str | None = None,
+    *,
+    with_ids: bool = False,
+) -> str:
+    """
+    Nạp lại toàn bộ từ điển kiểu blue/green:
+      1) dựng phiên bản mới dưới namespace staging dict:vi@<ver> (bản cũ vẫn phục vụ)
+      2) đổi con trỏ K_DICT_CURRENT -> mọi reader chuyển sang bản mới cùng lúc
+      3) namespace cũ được gắn TTL, Redis tự thu hồi sau RETIRED_DICT_TTL giây
+    Trả về namespace mới.
+    """
+    ns = K_DICT_NS(str(r.incr(K_DICT_SEQ())))
+    bootstrap_dictionary_by_token_exact(r, words, purge_before_load=True, ns=ns, with_ids=with_ids)
+    if fingerprint:
+        r.set(K_DICT_FINGERPRINT(ns), fingerprint)
+
+    pipe = r.pipeline()
+    pipe.get(K_DICT_CURRENT())
+    pipe.set(K_DICT_CURRENT(), ns)
+    old, _ = pipe.execute()
+    r.rpush(K_DICT_RETIRED(), old or DICT_NS_DEFAULT)
+    reclaim_retired_dictionaries(r)
+    logging.info("Dictionary switched %s -> %s", old or DICT_NS_DEFAULT, ns)
+    return ns
 
-    if n % batch != 0:
+
+def reclaim_retired_dictionaries(r: Redis, ttl: int = RETIRED_DICT_TTL) -> int:
+    """Gắn TTL cho mọi key của các namespace đã bị thay thế. Trả về số namespace đã xử lý."""
+    n = 0
+    while True:
+        ns = r.lpop(K_DICT_RETIRED())
+        if ns is None:
+            return n
+        if ns == r.get(K_DICT_CURRENT()):
+            continue
+        pipe = r.pipeline(transaction=False)
+        for k in _ns_keys(ns):
+            pipe.expire(k, ttl)
         pipe.execute()
+        for pattern in _ns_patterns(ns):
+            for keys in _scan_batches(r, pattern):
+                pipe = r.pipeline(transaction=False)
+                for k in keys:
+                    pipe.expire(k, ttl)
+                pipe.execute()
+        n += 1
+
+
+def file_fingerprint(path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def sync_dictionary_from_file(r: Redis, path, *, with_ids: bool = False) -> Dict[str, Any]:
+    """
+    Đồng bộ từ điển Redis với file, KHÔNG purge bản đang phục vụ:
+      - fingerprint file trùng với lần nạp trước -> bỏ qua
+      - đã có fingerprint cũ -> chỉ áp dụng phần thêm/xoá (diff với bản live)
+      - chưa có fingerprint (lần đầu / dữ liệu cũ) hoặc cần Word-ID mà bản live chưa có
+        -> dựng bản mới kiểu blue/green
+    Từ điển không bao giờ bị rỗng trong lúc ván đang chạy.
+    """
+    fp = file_fingerprint(path)
+    ns = current_ns(r)
+    prev = r.get(K_DICT_FINGERPRINT(ns))
+    if prev == fp and r.exists(K_DICT(ns)) and (not with_ids or r.exists(K_WID_NEXT(ns))):
+        return {"status": "unchanged", "added": 0, "removed": 0}
+
+    if prev is None or (with_ids and not r.exists(K_WID_NEXT(ns))):
+        ns = rebuild_dictionary(r, read_words_from_file(path), fingerprint=fp, with_ids=with_ids)
+        return {"status": "rebuild", "added": r.scard(K_DICT(ns)), "removed": 0}
+
+    phrases = set()
+    for raw in read_words_from_file(path):
+        phrase, ft, _ = phrase_tokens(raw)
+        if ft:
+            phrases.add(phrase)
+    current = r.smembers(K_DICT(ns))
+    added, removed = dict_apply_diff(r, phrases - current, current - phrases)
+
+    r.set(K_DICT_FINGERPRINT(ns), fp)
+    logging.info("Dictionary sync (diff): +%d / -%d", added, removed)
+    return {"status": "diff", "added": added, "removed": removed}
+
+
+def sync_dictionary_with_journal(r: Redis, journal, path, *, with_ids: bool = False) -> Dict[str, Any]:
+    """
+    Gộp journal vào file rồi đồng bộ Redis, giữ lock journal suốt cả hai bước: từ thêm
+    bằng ❤️ giữa lúc compact và lúc đọc bản live sẽ không bị diff coi là "thừa" rồi xoá.
+    """
+    with journal.locked():
+        journal.compact()
+        return sync_dictionary_from_file(r, path, with_ids=with_ids)
@@ -0,0 +1,100 @@
+# dict_journal.py
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+from .utils_vi import norm_phrase
+
+OP_ADD = "+"
+OP_REMOVE = "-"
+
+
+class DictJournal:
+    """
+    Từ điển trên đĩa = file snapshot (words.txt) + journal chỉ-ghi-thêm các bản ghi
+    "+từ" / "-từ" (tombstone). Thêm/xoá từ chỉ append 1 dòng nên chi phí O(1) bất kể
+    kích thước từ điển; compact() gộp journal vào snapshot (chạy nền).
+    Mọi thao tác ghi đi qua 1 lock (RLock, để locked() bọc được compact()) nên các task
+    thêm/xoá đồng thời không đè nhau.
+    """
+
+    def __init__(self, base_path, journal_path):
+        self.base_path = Path(base_path)
+        self.journal_path = Path(journal_path)
+        self._lock = threading.RLock()
+
+    def _append(self, op: str, phrase: str) -> None:
+        phrase = norm_phrase(phrase)
+        if not phrase:
+            return
+        with self._lock:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(f"{op}{phrase}\n")
+
+    @contextmanager
+    def locked(self):
+        """Chặn mọi thêm/xoá từ trong khối with (vd: compact + đồng bộ Redis liền một mạch)."""
+        with self._lock:
+            yield
+
+    def add(self, phrase: str) -> None:
+        self._append(OP_ADD, phrase)
+
+    def remove(self, phrase: str) -> None:
+        self._append(OP_REMOVE, phrase)
+
+    def pending(self) -> int:
+        """Số bản ghi journal chưa được gộp vào snapshot."""
+        if not self.journal_path.exists():
+            return 0
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            return sum(1 for line in f if line.strip())
+
+    def _materialize(self) -> Dict[str, str]:
+        # norm -> dòng gốc, giữ nguyên thứ tự file snapshot
+        words: Dict[str, str] = {}
+        if self.base_path.exists():
+            with open(self.base_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.rstrip("\n")
+                    key = norm_phrase(line)
+                    if key and key not in words:
+                        words[key] = line
+        if self.journal_path.exists():
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    op, phrase = line[:1], line[1:].strip()
+                    if not phrase:
+                        continue
+                    if op == OP_ADD:
+                        words.setdefault(phrase, phrase)
+                    elif op == OP_REMOVE:
+                        words.pop(phrase, None)
+        return words
+
+    def compact(self) -> int:
+        """Gộp journal vào snapshot (ghi file tạm rồi os.replace). Trả về số bản ghi đã gộp."""
+        with self._lock:
+            if not self.journal_path.exists():
+                return 0
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                n = sum(1 for line in f if line.strip())
+            if n:
+                words = self._materialize()
+                tmp = self.base_path.with_suffix(self.base_path.suffix + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    for line in words.values():
+                        f.write(line + "\n")
+                os.replace(tmp, self.base_path)
+            self.journal_path.unlink()
+        if n:
+            logging.info("Compacted %d journal records into %s", n, self.base_path)
+        return n
+
+    def compact_if_needed(self, min_records: int = 200) -> int:
+        if self.pending() < min_records:
+            return 0
+        return self.compact()
@@ -0,0 +1,153 @@
+from typing import Iterable
+from redis import Redis
+from redis.asyncio import Redis as AsyncRedis
+from .utils_vi import norm_phrase, first_token, last_token
+from .redis_keys import DICT_NS_DEFAULT, K_DICT_CURRENT, K_DICT
+
+# Các script tự đọc namespace đang phục vụ (K_DICT_CURRENT) nên luôn ghi vào
+# đúng phiên bản live, kể cả khi vừa đổi phiên bản giữa chừng.
+# Tên key phải khớp redis_keys: <ns>, <ns>:playable, <ns>:tokenx:<tok>, <ns>:lastx:<tok>,
+# <ns>:wid* (chỉ có khi namespace được dựng kèm Word-ID, xem K_WID_NEXT)
+_NS_LUA = r"""
+local NS = redis.call("GET", KEYS[1]) or ARGV[4]
+local K_DICT, K_PLAYABLE = NS, NS .. ":playable"
+local P_TOKEN_IDX, P_LAST_IDX = NS .. ":tokenx:", NS .. ":lastx:"
+local K_WID, K_WID_REV, K_WID_NEXT = NS .. ":wid", NS .. ":wid_rev", NS .. ":wid_next"
+local K_WID_DEAD, P_WID_EXTRA = NS .. ":wid_dead", NS .. ":wid_extra:"
+local phrase, ft, lt = ARGV[1], ARGV[2], ARGV[3]
+"""
+
+# Thêm 1 từ vào dict + index, đồng thời giữ tập "playable" (từ mở màn hợp lệ) đúng.
+# KEYS: current ; ARGV: phrase, ft, lt, default_ns
+ADD_LUA = _NS_LUA + r"""
+if redis.call("SADD", K_DICT, phrase) == 0 then
+  return 0
+end
+redis.call("SADD", P_TOKEN_IDX .. ft, phrase)
+if lt ~= "" then
+  redis.call("SADD", P_LAST_IDX .. lt, phrase)
+  if redis.call("SCARD", P_TOKEN_IDX .. lt) > 0 then
+    redis.call("SADD", K_PLAYABLE, phrase)
+  end
+end
+-- token ft vừa có từ đầu tiên: mọi từ kết thúc bằng ft trở thành playable
+if redis.call("SCARD", P_TOKEN_IDX .. ft) == 1 then
+  for _, m in ipairs(redis.call("SMEMBERS", P_LAST_IDX .. ft)) do
+    redis.call("SADD", K_PLAYABLE, m)
+  end
+end
+if redis.call("EXISTS", K_WID_NEXT) == 1 then
+  local id = redis.call("INCR", K_WID_NEXT) - 1
+  redis.call("HSET", K_WID, phrase, id)
+  redis.call("HSET", K_WID_REV, id, phrase)
+  redis.call("SADD", P_WID_EXTRA .. ft, id)
+end
+return 1
+"""
+
+# Xoá 1 từ khỏi dict + index; nếu token ft hết từ thì các từ kết thúc bằng ft
+# không còn nước đi -> rút khỏi playable.
+# KEYS: current ; ARGV: phrase, ft, lt, default_ns
+REMOVE_LUA = _NS_LUA + r"""
+if redis.call("SREM", K_DICT, phrase) == 0 then
+  return 0
+end
+redis.call("SREM", P_TOKEN_IDX .. ft, phrase)
+redis.call("SREM", K_PLAYABLE, phrase)
+if lt ~= "" then
+  redis.call("SREM", P_LAST_IDX .. lt, phrase)
+end
+if redis.call("SCARD", P_TOKEN_IDX .. ft) == 0 then
+  for _, m in ipairs(redis.call("SMEMBERS", P_LAST_IDX .. ft)) do
+    redis.call("SREM", K_PLAYABLE, m)
+  end
+end
+local id = redis.call("HGET", K_WID, phrase)
+if id then
+  redis.call("HDEL", K_WID, phrase)
+  redis.call("HDEL", K_WID_REV, id)
+  redis.call("SREM", P_WID_EXTRA .. ft, id)
+  redis.call("SETBIT", K_WID_DEAD, id, 1)
+end
+return 1
+"""
+
+_scripts = {}
+
+
+def _script(r, src: str):
+    # Script của client sync và async là 2 loại object khác nhau -> cache riêng
+    key = (isinstance(r, AsyncRedis), src)
+    s = _scripts.get(key)
+    if s is None:
+        s = _scripts[key] = r.register_script(src)
+    return s
+
+
+def current_ns(r: Redis) -> str:
+    """Namespace của phiên bản từ điển đang phục vụ."""
+    return r.get(K_DICT_CURRENT()) or DICT_NS_DEFAULT
+
+
+async def current_ns_async(r: AsyncRedis) -> str:
+    return await r.get(K_DICT_CURRENT()) or DICT_NS_DEFAULT
+
+
+async def dict_contains(r: AsyncRedis, phrase: str) -> bool:
+    """Từ có trong phiên bản từ điển đang phục vụ không."""
+    return bool(await r.sismember(K_DICT(await current_ns_async(r)), norm_phrase(phrase)))
+
+
+def _args(phrase: str) -> list[str]:
+    return [phrase, first_token(phrase), last_token(phrase) or "", DICT_NS_DEFAULT]
+
+
+async def _run(r: AsyncRedis, src: str, phrase: str) -> bool:
+    phrase = norm_phrase(phrase)
+    if not first_token(phrase):
+        return False
+    res = await _script(r, src)(keys=[K_DICT_CURRENT()], args=_args(phrase), client=r)
+    return bool(res)
+
+
+async def dict_add_phrase(r: AsyncRedis, phrase: str) -> bool:
+    """Thêm từ vào từ điển Redis (atomic). Trả về False nếu đã tồn tại."""
+    return await _run(r, ADD_LUA, phrase)
+
+
+async def dict_remove_phrase(r: AsyncRedis, phrase: str) -> bool:
+    """Xoá từ khỏi từ điển Redis (atomic). Trả về False nếu không có."""
+    return await _run(r, REMOVE_LUA, phrase)
+
+
+def _apply_batched(r: Redis, src: str, phrases: Iterable[str], batch: int) -> int:
+    script = _script(r, src)
+    pipe = r.pipeline(transaction=False)
+    pending = done = 0
+    for phrase in phrases:
+        phrase = norm_phrase(phrase)
+        if not first_token(phrase):
+            continue
+        script(keys=[K_DICT_CURRENT()], args=_args(phrase), client=pipe)
+        pending += 1
+        if pending == batch:
+            done += sum(1 for x in pipe.execute() if x)
+            pending = 0
+    if pending:
+        done += sum(1 for x in pipe.execute() if x)
+    return done
+
+
+def dict_apply_diff(
+    r: Redis,
+    added: Iterable[str],
+    removed: Iterable[str],
+    batch: int = 2000,
+) -> tuple[int, int]:
+    """
+    Áp dụng thay đổi (thêm/xoá) lên từ điển đang chạy, theo lô pipeline.
+    Từ điển không bao giờ bị rỗng giữa chừng. Trả về (số từ thêm, số từ xoá) thực sự.
+    """
+    n_removed = _apply_batched(r, REMOVE_LUA, removed, batch)
+    n_added = _apply_batched(r, ADD_LUA, added, batch)
+    return n_added, n_removed
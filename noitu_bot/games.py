@@ -0,0 +1,158 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional, List
+from redis.asyncio import Redis
+from .referee import WordChainRefereeByLastWordExact, create_referee
+
+
+def game_id_for_channel(channel_id: int) -> str:
+    return f"channel:{channel_id}"
+
+
+class SubmitActor:
+    """
+    Actor chấm lượt của 1 game: 1 hàng đợi + 1 worker, nên các lượt trong cùng kênh
+    được chấm đúng thứ tự nhận. Khi có dồn dập, worker gom tối đa max_batch lượt đang
+    chờ vào 1 pipeline (referee.submit_many) thay vì mỗi lượt 1 round trip.
+    Worker tự dừng khi hàng đợi rỗng và được tạo lại ở lượt kế tiếp.
+    """
+
+    def __init__(self, ref: WordChainRefereeByLastWordExact, *, max_batch: int = 32):
+        self.ref = ref
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[tuple]" = asyncio.Queue()
+        self._worker: Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    async def submit(self, user_id: str, raw_phrase: str) -> Dict[str, Any]:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((user_id, raw_phrase, fut))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        return await fut
+
+    async def _run(self) -> None:
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                results = await self.ref.submit_many([(u, p) for u, p, _ in batch])
+            except Exception as e:
+                logging.exception("Submit batch failed for %s: %s", self.ref.gid, e)
+                for _, _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, _, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+
+@dataclass
+class Game:
+    """State trong bộ nhớ của 1 kênh nối từ (state ván chơi nằm trong Redis)."""
+
+    channel_id: int
+    ref: WordChainRefereeByLastWordExact
+    last_active: float = field(default_factory=time.monotonic)
+    actor: SubmitActor = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.actor = SubmitActor(self.ref)
+
+    @property
+    def gid(self) -> str:
+        return self.ref.gid
+
+    async def submit(self, user_id: str, raw_phrase: str) -> Dict[str, Any]:
+        """Mọi lượt chơi của kênh đi qua actor (đúng thứ tự, gom lô)."""
+        return await self.actor.submit(user_id, raw_phrase)
+
+    def touch(self) -> None:
+        self.last_active = time.monotonic()
+
+
+class GameRegistry:
+    """
+    Quản lý nhiều kênh nối từ trong 1 process: tạo referee theo kênh khi cần (lazy),
+    và bỏ khỏi bộ nhớ các game không hoạt động (LRU + idle timeout) để bộ nhớ có giới hạn.
+    Game bị bỏ vẫn giữ nguyên state trong Redis, lần sau truy cập sẽ được tạo lại.
+    """
+
+    def __init__(
+        self,
+        r: Redis,
+        channel_ids: Iterable[int],
+        *,
+        max_games: int = 256,
+        idle_seconds: float = 6 * 3600,
+    ):
+        self.r = r
+        self.channel_ids = set(channel_ids)
+        self.max_games = max_games
+        self.idle_seconds = idle_seconds
+        self._games: "OrderedDict[int, Game]" = OrderedDict()
+
+    def is_game_channel(self, channel_id: Optional[int]) -> bool:
+        return channel_id in self.channel_ids
+
+    def get(self, channel_id: Optional[int]) -> Optional[Game]:
+        """Game của kênh (tạo nếu chưa có); None nếu kênh không phải kênh nối từ."""
+        if not self.is_game_channel(channel_id):
+            return None
+        game = self._games.get(channel_id)
+        if game is None:
+            # Dọn chỗ TRƯỚC khi thêm: game vừa tạo (caller đang giữ) không thể bị chọn bỏ
+            self._evict_over_capacity(reserve=1)
+            game = Game(channel_id, create_referee(self.r, game_id_for_channel(channel_id)))
+            self._games[channel_id] = game
+        else:
+            self._games.move_to_end(channel_id)
+        game.touch()
+        return game
+
+    def active(self) -> List[Game]:
+        """Các game đang nằm trong bộ nhớ."""
+        return list(self._games.values())
+
+    def _all_referees(self) -> List[WordChainRefereeByLastWordExact]:
+        # Game đã bị bỏ khỏi bộ nhớ vẫn còn ván trong Redis: tạo referee tạm (không vào LRU)
+        refs = []
+        for cid in self.channel_ids:
+            game = self._games.get(cid)
+            refs.append(game.ref if game is not None else create_referee(self.r, game_id_for_channel(cid)))
+        return refs
+
+    async def note_added(self, phrase: str) -> None:
+        """Báo từ mới cho ván của MỌI kênh nối từ (kể cả game không còn trong bộ nhớ)."""
+        await asyncio.gather(*(ref.note_added(phrase) for ref in self._all_referees()))
+
+    async def note_removed(self, phrase: str) -> None:
+        await asyncio.gather(*(ref.note_removed(phrase) for ref in self._all_referees()))
+
+    def evict_idle(self) -> int:
+        now = time.monotonic()
+        idle = [
+            cid for cid, g in self._games.items()
+            if now - g.last_active >= self.idle_seconds and not g.actor.busy
+        ]
+        for cid in idle:
+            self._evict(cid)
+        return len(idle)
+
+    def _evict_over_capacity(self, reserve: int) -> None:
+        # Không bỏ game đang chấm dở, tránh 2 actor cùng chạy cho 1 kênh
+        over = len(self._games) + reserve - self.max_games
+        for cid in [cid for cid, g in self._games.items() if not g.actor.busy][:max(over, 0)]:
+            self._evict(cid)
+
+    def _evict(self, channel_id: int) -> None:
+        self._games.pop(channel_id, None)
+        logging.info("Evicted idle game for channel %s", channel_id)
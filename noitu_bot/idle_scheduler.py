@@ -0,0 +1,69 @@
+import heapq
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+
+class IdleScheduler:
+    """
+    Hẹn giờ "kênh im lặng quá delay giây thì gọi callback(channel_id)", dùng min-heap
+    các hạn chót + 1 task chờ đúng tới hạn gần nhất (không poll định kỳ).
+      - touch(cid): có hoạt động -> dời hạn của kênh tới now + delay
+      - mỗi lần im lặng chỉ gọi callback 1 lần; touch tiếp theo mới hẹn lại
+    Dời hạn không xoá entry cũ trong heap (lazy deletion): entry lệch với _deadlines bị bỏ
+    qua khi tới lượt; heap được dựng lại khi entry cũ chiếm đa số.
+    """
+
+    def __init__(self, delay: float, callback: Callable[[int], Awaitable[None]]):
+        self.delay = delay
+        self.callback = callback
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+    def touch(self, channel_id: int) -> None:
+        deadline = time.monotonic() + self.delay
+        self._deadlines[channel_id] = deadline
+        heapq.heappush(self._heap, (deadline, channel_id))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, cid) for cid, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+        if self._heap[0] == (deadline, channel_id):
+            self._wakeup.set()  # hạn mới sớm hơn hạn runner đang chờ
+
+    def _pop_due(self, now: float) -> List[int]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, cid = heapq.heappop(self._heap)
+            if self._deadlines.get(cid) == deadline:
+                del self._deadlines[cid]
+                due.append(cid)
+        return due
+
+    async def _fire(self, channel_id: int) -> None:
+        try:
+            await self.callback(channel_id)
+        except Exception as e:
+            logging.error(f"Idle callback lỗi ở kênh {channel_id}: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            for cid in self._pop_due(time.monotonic()):
+                asyncio.create_task(self._fire(cid))
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
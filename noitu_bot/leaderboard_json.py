@@ -1,7 +1,10 @@
 from __future__ import annotations
-import os, json, tempfile
-from typing import Dict, List, Optional
+import os, json, tempfile, threading, atexit, logging, asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 import discord
+from .config import STATS_BACKEND, ATTEMPT_FLUSH_EVENTS
+from .stats_store import StatsStore
 
 # START FIX: IMPORTS VÀ FALLBACK CHO MONITORING METRICS
 try:
@@ -28,6 +31,146 @@ def lb_path(base_dir: str = "./data") -> str:
     return os.path.join(base_dir, "leaderboard.json")
 
 
+def lb_periods_path(base_dir: str = "./data") -> str:
+    os.makedirs(base_dir, exist_ok=True)
+    return os.path.join(base_dir, "leaderboard_periods.json")
+
+
+def stats_db_path(base_dir: str = "./data") -> str:
+    os.makedirs(base_dir, exist_ok=True)
+    return os.path.join(base_dir, "stats.sqlite3")
+
+
+_stores: Dict[str, StatsStore] = {}
+_stores_lock = threading.Lock()
+
+
+# Store SQLite theo base_dir; lần mở đầu tiên tự nhập leaderboard.json cũ (1 lần)
+def get_stats_store(base_dir: str = "./data") -> StatsStore:
+    key = os.path.abspath(base_dir)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                store = StatsStore(stats_db_path(base_dir))
+                store.import_json(lb_path(base_dir))
+                _stores[key] = store
+    return store
+
+
+def _use_sqlite() -> bool:
+    return STATS_BACKEND == "sqlite"
+
+
+# Kỳ xếp hạng tính theo giờ Việt Nam (UTC+7, không có giờ mùa hè)
+_VN_TZ = timezone(timedelta(hours=7))
+
+PERIOD_ALL = "all"
+PERIOD_LABELS = {
+    PERIOD_ALL: "Mọi thời đại",
+    "day": "Hôm nay",
+    "week": "Tuần này",
+    "month": "Tháng này",
+}
+
+
+def period_keys(now: Optional[datetime] = None) -> Dict[str, str]:
+    """Khoá của kỳ hiện tại cho từng loại BXH, vd {"day": "d:2026-10-18", "week": "w:2026-W42", ...}."""
+    now = now or datetime.now(_VN_TZ)
+    year, week, _ = now.isocalendar()
+    return {
+        "day": f"d:{now:%Y-%m-%d}",
+        "week": f"w:{year}-W{week:02d}",
+        "month": f"m:{now:%Y-%m}",
+    }
+
+
+# Ghi JSON luôn là read-modify-write cả file -> tuần tự hoá để không mất cập nhật
+_json_lock = threading.Lock()
+
+
+class AttemptBuffer:
+    """
+    Write-behind cho bộ đếm lượt đánh: gom delta (total_attempts, correct_words) theo user
+    trong RAM và ghi 1 lần cho cả lô. flush() được gọi định kỳ, khi đủ max_events lượt,
+    trước mọi lần đọc BXH và khi tắt process.
+    """
+
+    def __init__(self, base_dir: str, max_events: int = ATTEMPT_FLUSH_EVENTS):
+        self.base_dir = base_dir
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._deltas: Dict[str, List[int]] = {}
+        self._events = 0
+
+    def record(self, user_id: str, is_correct: bool) -> bool:
+        """Cộng dồn 1 lượt; trả về True nếu đã đủ lượt cần flush."""
+        with self._lock:
+            d = self._deltas.setdefault(user_id, [0, 0])
+            d[0] += 1
+            if is_correct:
+                d[1] += 1
+            self._events += 1
+            return self._events >= self.max_events
+
+    def flush(self) -> int:
+        """Ghi toàn bộ delta đang giữ. Lỗi ghi thì trả delta lại buffer để không mất lượt."""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, {}
+                self._events = 0
+            if not deltas:
+                return 0
+            batch = {uid: (d[0], d[1]) for uid, d in deltas.items()}
+            try:
+                if _use_sqlite():
+                    get_stats_store(self.base_dir).add_attempts(batch)
+                else:
+                    _json_add_attempts(self.base_dir, batch)
+            except Exception:
+                with self._lock:
+                    for uid, (attempts, correct) in batch.items():
+                        d = self._deltas.setdefault(uid, [0, 0])
+                        d[0] += attempts
+                        d[1] += correct
+                        self._events += attempts
+                raise
+            return len(batch)
+
+
+_buffers: Dict[str, AttemptBuffer] = {}
+
+
+def _attempt_buffer(base_dir: str) -> AttemptBuffer:
+    key = os.path.abspath(base_dir)
+    buf = _buffers.get(key)
+    if buf is None:
+        with _stores_lock:
+            buf = _buffers.setdefault(key, AttemptBuffer(base_dir))
+    return buf
+
+
+def flush_word_attempts(base_dir: Optional[str] = None) -> int:
+    """Ghi các bộ đếm lượt đánh còn trong RAM (base_dir=None: mọi buffer)."""
+    if base_dir is not None:
+        buffers = [_attempt_buffer(base_dir)]
+    else:
+        buffers = list(_buffers.values())
+    return sum(buf.flush() for buf in buffers)
+
+
+def _flush_at_exit() -> None:
+    try:
+        flush_word_attempts()
+    except Exception as e:
+        logging.error("Không thể ghi bộ đếm lượt đánh khi tắt: %s", e)
+
+
+atexit.register(_flush_at_exit)
+
+
 # Đọc JSON
 def _read_json(path: str) -> Dict[str, Dict[str, object]]:
     try:
@@ -59,42 +202,144 @@ def _atomic_write(path: str, data: Dict[str, Dict[str, object]]) -> None:
 
 
 # Ghi log số lần đánh từ (hàm mới)
-def record_word_attempt_json(user_id: str, is_correct: bool, base_dir: str = "./data"):
-    path = lb_path(base_dir)
-    data = _read_json(path)
-    user_data = data.get(user_id, {"name": f"UID:{user_id}", "wins": 0, "correct_words": 0, "total_attempts": 0})
-
-    user_data["total_attempts"] = user_data.get("total_attempts", 0) + 1
-    if is_correct:
-        user_data["correct_words"] = user_data.get("correct_words", 0) + 1
-
-    # Đảm bảo name tồn tại khi chưa thắng
-    if "name" not in user_data:
-        user_data["name"] = f"UID:{user_id}"
-
-    data[user_id] = user_data
-    _atomic_write(path, data)
+# Chỉ cộng vào buffer trong RAM (không I/O, gọi thẳng trên event loop được); trả về True
+# khi buffer đã đủ lượt -> người gọi chạy flush_word_attempts (trong thread)
+def record_word_attempt_json(user_id: str, is_correct: bool, base_dir: str = "./data") -> bool:
+    return _attempt_buffer(base_dir).record(user_id, is_correct)
+
+
+def _json_add_attempts(base_dir: str, deltas: Dict[str, Tuple[int, int]]) -> None:
+    with _json_lock:
+        path = lb_path(base_dir)
+        data = _read_json(path)
+        for user_id, (attempts, correct) in deltas.items():
+            user_data = data.get(user_id, {"name": f"UID:{user_id}", "wins": 0, "correct_words": 0, "total_attempts": 0})
+
+            user_data["total_attempts"] = user_data.get("total_attempts", 0) + attempts
+            user_data["correct_words"] = user_data.get("correct_words", 0) + correct
+
+            # Đảm bảo name tồn tại khi chưa thắng
+            if "name" not in user_data:
+                user_data["name"] = f"UID:{user_id}"
+
+            data[user_id] = user_data
+        _atomic_write(path, data)
+
+
+class LeaderboardCache:
+    """
+    Cache BXH theo phiên bản dữ liệu: version chỉ tăng khi số trận thắng thay đổi
+    (record_win_json / reset). Mỗi (base_dir, kỳ) giữ sẵn bảng đã sắp xếp (tối đa MAX_N)
+    và payload embed đã render theo từng N, nên xem lại BXH không tốn I/O hay sắp xếp.
+    Cột "Từ đúng" được làm mới cùng lúc với lần thắng kế tiếp.
+    """
+
+    MAX_N = 25
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        # (base_dir, khoá kỳ) -> (version, rows, {N: embed dict})
+        self._entries: Dict[Tuple[str, str], Tuple[int, List[Dict[str, object]], Dict[int, dict]]] = {}
+
+    def version(self, base_dir: str) -> int:
+        return self._versions.get(os.path.abspath(base_dir), 0)
+
+    def bump(self, base_dir: str) -> None:
+        key = os.path.abspath(base_dir)
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    @staticmethod
+    def _key(base_dir: str, period: str) -> Tuple[str, str]:
+        # Khoá theo kỳ cụ thể (vd "d:2026-10-18") nên sang ngày/tuần/tháng mới tự hết hạn
+        return os.path.abspath(base_dir), (PERIOD_ALL if period == PERIOD_ALL else period_keys()[period])
+
+    def _fresh(self, base_dir: str, period: str):
+        entry = self._entries.get(self._key(base_dir, period))
+        if entry is not None and entry[0] == self.version(base_dir):
+            return entry
+        return None
+
+    def rows(self, top_n: int, base_dir: str, period: str) -> List[Dict[str, object]]:
+        entry = self._fresh(base_dir, period)
+        if entry is None:
+            version = self.version(base_dir)
+            rows = get_leaderboard_json(top_n=self.MAX_N, base_dir=base_dir, period=period)
+            entry = (version, rows, {})
+            with self._lock:
+                self._entries[self._key(base_dir, period)] = entry
+        return entry[1][:max(0, top_n)]
+
+    def cached_embed(self, top_n: int, base_dir: str, period: str) -> Optional[discord.Embed]:
+        """Embed đã render nếu còn đúng phiên bản, không thì None (không I/O)."""
+        entry = self._fresh(base_dir, period)
+        if entry is None or top_n not in entry[2]:
+            return None
+        return discord.Embed.from_dict(entry[2][top_n])
+
+    def embed(self, top_n: int, base_dir: str, period: str) -> discord.Embed:
+        embed = self.cached_embed(top_n, base_dir, period)
+        if embed is not None:
+            return embed
+        rows = self.rows(top_n, base_dir, period)
+        embed = format_leaderboard_embed(rows, period=period)
+        entry = self._fresh(base_dir, period)
+        if entry is not None:
+            entry[2][top_n] = embed.to_dict()
+        return embed
+
+
+_lb_cache = LeaderboardCache()
+
+
+# BXH đã render (dùng cache); chỉ đọc dữ liệu trong thread khi cache hết hạn
+async def get_leaderboard_embed(top_n: int = 10, base_dir: str = "./data",
+                                period: str = PERIOD_ALL) -> discord.Embed:
+    embed = _lb_cache.cached_embed(top_n, base_dir, period)
+    if embed is None:
+        embed = await asyncio.to_thread(_lb_cache.embed, top_n, base_dir, period)
+    return embed
 
 
 # Ghi nhận 1 lượt thắng (đã sửa để cập nhật cấu trúc data mới và tăng metric)
 def record_win_json(user_id: str, display_name: Optional[str],
                     base_dir: str = "./data") -> int:
-    path = lb_path(base_dir)
-    data = _read_json(path)
-    entry = data.get(user_id,
-                     {"name": display_name or f"UID:{user_id}", "wins": 0, "correct_words": 0, "total_attempts": 0})
-
-    if display_name and entry.get("name") != display_name:
-        entry["name"] = display_name
-
-    entry["wins"] = int(entry.get("wins", 0)) + 1
-
-    # Đảm bảo các trường metrics tồn tại
-    entry["correct_words"] = entry.get("correct_words", 0)
-    entry["total_attempts"] = entry.get("total_attempts", 0)
-
-    data[user_id] = entry
-    _atomic_write(path, data)
+    periods = period_keys()
+    if _use_sqlite():
+        wins = get_stats_store(base_dir).record_win(user_id, display_name, periods.values())
+        _lb_cache.bump(base_dir)
+        GAMES_COMPLETED_COUNTER.inc()
+        return wins
+
+    with _json_lock:
+        path = lb_path(base_dir)
+        data = _read_json(path)
+        entry = data.get(user_id,
+                         {"name": display_name or f"UID:{user_id}", "wins": 0, "correct_words": 0, "total_attempts": 0})
+
+        if display_name and entry.get("name") != display_name:
+            entry["name"] = display_name
+
+        entry["wins"] = int(entry.get("wins", 0)) + 1
+
+        # Đảm bảo các trường metrics tồn tại
+        entry["correct_words"] = entry.get("correct_words", 0)
+        entry["total_attempts"] = entry.get("total_attempts", 0)
+
+        data[user_id] = entry
+        _atomic_write(path, data)
+
+        # Bộ đếm theo kỳ: chỉ giữ kỳ hiện tại, kỳ cũ bị bỏ khi sang kỳ mới
+        ppath = lb_periods_path(base_dir)
+        old = _read_json(ppath)
+        by_period = {}
+        for key in periods.values():
+            counts = old.get(key, {})
+            counts[user_id] = int(counts.get(user_id, 0)) + 1
+            by_period[key] = counts
+        _atomic_write(ppath, by_period)
+    _lb_cache.bump(base_dir)
 
     # Tăng metric GAMES_COMPLETED
     GAMES_COMPLETED_COUNTER.inc()
@@ -103,9 +348,23 @@ def record_win_json(user_id: str, display_name: Optional[str],
 
 
 # Lấy BXH top N (Đã sửa để lấy metrics)
-def get_leaderboard_json(top_n: int = 10, base_dir: str = "./data") -> List[Dict[str, object]]:
+# period: "all" (mặc định), "day", "week" hoặc "month" (xem PERIOD_LABELS)
+def get_leaderboard_json(top_n: int = 10, base_dir: str = "./data",
+                         period: str = PERIOD_ALL) -> List[Dict[str, object]]:
+    # Đọc BXH luôn thấy đủ các lượt đánh còn nằm trong buffer
+    _attempt_buffer(base_dir).flush()
+    key = None if period == PERIOD_ALL else period_keys()[period]
+    if _use_sqlite():
+        return get_stats_store(base_dir).top(top_n, key)
+
     path = lb_path(base_dir)
     data = _read_json(path)
+    if key is not None:
+        counts = _read_json(lb_periods_path(base_dir)).get(key, {})
+        data = {
+            uid: {**data.get(uid, {"name": f"UID:{uid}"}), "wins": wins}
+            for uid, wins in counts.items()
+        }
 
     # Cập nhật và sắp xếp lại dữ liệu theo số lần thắng
     items = sorted(
@@ -128,17 +387,23 @@ def get_leaderboard_json(top_n: int = 10, base_dir: str = "./data") -> List[Dict
 
 # Reset BXH
 def reset_leaderboard_json(base_dir: str = "./data") -> None:
-    path = lb_path(base_dir)
-    try:
-        os.remove(path)
-    except FileNotFoundError:
-        pass
+    _attempt_buffer(base_dir).flush()
+    _lb_cache.bump(base_dir)
+    if _use_sqlite():
+        get_stats_store(base_dir).reset()
+        return
+
+    for path in (lb_path(base_dir), lb_periods_path(base_dir)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
 
 
-def format_leaderboard_embed(rows: List[Dict[str, object]]) -> discord.Embed:
+def format_leaderboard_embed(rows: List[Dict[str, object]], period: str = PERIOD_ALL) -> discord.Embed:
     if not rows:
         return discord.Embed(
-            title="🏆 Bảng xếp hạng",
+            title="🏆 Bảng xếp hạng" if period == PERIOD_ALL else f"🏆 Bảng xếp hạng - {PERIOD_LABELS[period]}",
             description="Chưa có ai thắng!",
             color=discord.Color.dark_grey()
         )
@@ -171,7 +436,11 @@ def format_leaderboard_embed(rows: List[Dict[str, object]]) -> discord.Embed:
         accuracy.append(acc_str)
 
     embed = discord.Embed(
-        title="🏆 Bảng xếp hạng Nối Từ - Top 10 🏆",
+        title=(
+            "🏆 Bảng xếp hạng Nối Từ - Top 10 🏆"
+            if period == PERIOD_ALL
+            else f"🏆 Bảng xếp hạng Nối Từ - {PERIOD_LABELS[period]} 🏆"
+        ),
         description="Ai là Chúa tể ngôn ngữ?",
         color=discord.Color.gold(),
     )
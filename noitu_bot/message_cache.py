@@ -0,0 +1,71 @@
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional
+import discord
+
+
+class BotMessageCache:
+    """
+    LRU các tin nhắn bot vừa gửi (message_id -> nội dung), tối đa maxsize tin.
+    Dùng để biết 1 tin reply có trả lời bot hay không (và lấy nội dung tin gốc)
+    mà không cần gọi REST fetch_message.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[int, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def remember(self, message: discord.Message) -> None:
+        self._items[message.id] = message.content or ""
+        self._items.move_to_end(message.id)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def get(self, message_id: int) -> Optional[str]:
+        content = self._items.get(message_id)
+        if content is not None:
+            self._items.move_to_end(message_id)
+        return content
+
+    def replied_content(self, message: discord.Message, bot_user) -> Optional[str]:
+        """
+        Nội dung tin của bot mà message đang reply; None nếu không phải reply cho bot.
+        Ưu tiên dữ liệu gateway gửi kèm (reference.resolved), sau đó tới LRU.
+        """
+        ref = message.reference
+        if ref is None or ref.message_id is None:
+            return None
+        resolved = ref.resolved
+        if isinstance(resolved, discord.DeletedReferencedMessage):
+            return None
+        if isinstance(resolved, discord.Message):
+            if bot_user is None or resolved.author.id != bot_user.id:
+                return None
+            return resolved.content or ""
+        return self.get(ref.message_id)
+
+
+class GameMessageRing:
+    """
+    Ring buffer nội dung các tin gần nhất trong mỗi kênh nối từ (capacity tin / kênh),
+    nạp từ on_message. Reaction ❤️/❌ tra nội dung tại đây, chỉ fetch_message khi trượt.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self._order: Dict[int, Deque[int]] = {}  # channel_id -> message_id theo thứ tự nhận
+        self._content: Dict[int, Dict[int, str]] = {}  # channel_id -> {message_id: nội dung}
+
+    def put(self, channel_id: int, message_id: int, content: str) -> None:
+        order = self._order.setdefault(channel_id, deque())
+        content_by_id = self._content.setdefault(channel_id, {})
+        if message_id not in content_by_id:
+            if len(order) >= self.capacity:
+                content_by_id.pop(order.popleft(), None)
+            order.append(message_id)
+        content_by_id[message_id] = content
+
+    def get(self, channel_id: int, message_id: int) -> Optional[str]:
+        return self._content.get(channel_id, {}).get(message_id)
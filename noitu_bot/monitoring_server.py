@@ -3,7 +3,7 @@ import threading
 import logging
 from fastapi import FastAPI
 from starlette.responses import JSONResponse, PlainTextResponse
-from prometheus_client import start_http_server, Counter, Gauge, generate_latest
+from prometheus_client import start_http_server, Counter, Gauge, Histogram, generate_latest
 
 # Tắt logging của Uvicorn để không làm lẫn lộn với logs của bot
 log = logging.getLogger('uvicorn.error')
@@ -26,6 +26,55 @@ GAMES_COMPLETED_COUNTER = Counter(
     'noitu_games_completed',
     'Total number of Word-Chain games completed'
 )
+# 4. Tiến độ / thời gian nạp từ điển hàng loạt
+DICT_LOAD_PROGRESS = Gauge(
+    'noitu_dict_load_members',
+    'Set members written so far by the running dictionary bulk load'
+)
+DICT_LOAD_SECONDS = Gauge(
+    'noitu_dict_load_seconds',
+    'Duration of the last dictionary bulk load in seconds'
+)
+# 5. Cache kết quả AI kiểm tra từ (Label: 'hit', 'miss', 'shared', 'limited')
+AI_VERDICT_CACHE_COUNTER = Counter(
+    'noitu_ai_verdict_cache',
+    'Word-check lookups by outcome of the verdict cache / single-flight layer',
+    ['result']
+)
+# 6. Rate limiter: số lượt được phép / bị từ chối và thời gian phải chờ khi bị từ chối
+RATE_LIMIT_COUNTER = Counter(
+    'noitu_rate_limit_decisions',
+    'Rate limiter decisions by limiter name and outcome',
+    ['limiter', 'result']
+)
+RATE_LIMIT_WAIT = Histogram(
+    'noitu_rate_limit_wait_seconds',
+    'Time until the next allowed call when a rate limiter rejects',
+    ['limiter'],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120)
+)
+
+# 7. Trạng thái circuit breaker của cổng gọi AI (0 = closed, 1 = half_open, 2 = open)
+AI_CIRCUIT_STATE = Gauge(
+    'noitu_ai_circuit_state',
+    'AI gateway circuit breaker state (0 closed, 1 half-open, 2 open)'
+)
+# 8. Hàng đợi trả lời chat: số tin đang chờ và số tin bị bỏ (Label: 'merged', 'overflow', 'stale')
+CHAT_REPLY_QUEUE_DEPTH = Gauge(
+    'noitu_chat_reply_queue_depth',
+    'Chat replies waiting in the reply scheduler across all channels'
+)
+CHAT_REPLY_DROPPED = Counter(
+    'noitu_chat_reply_dropped',
+    'Chat replies dropped by the reply scheduler',
+    ['reason']
+)
+# 9. Xử lý reaction ❤️/❌: số lời gọi REST đã thực hiện / tránh được nhờ cache
+REACTION_REST_CALLS = Counter(
+    'noitu_reaction_rest_calls',
+    'REST lookups needed by reaction moderation, made or avoided via local caches',
+    ['call', 'result']
+)
 
 # FastAPI app setup
 app = FastAPI(title="W-Lex Monitoring API")
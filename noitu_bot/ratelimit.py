@@ -1,33 +1,171 @@
+import os
 import time
-import asyncio
+import logging
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+from redis.asyncio import Redis
+from .redis_keys import K_RATELIMIT
+
+try:
+    from .monitoring_server import RATE_LIMIT_COUNTER, RATE_LIMIT_WAIT
+except ImportError:
+    class DummyMetric:
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self):
+            pass
+
+        def observe(self, value):
+            pass
+
+
+    RATE_LIMIT_COUNTER = DummyMetric()
+    RATE_LIMIT_WAIT = DummyMetric()
+
+MODE_TOKEN_BUCKET = "token"
+MODE_SLIDING_LOG = "sliding"
+
+# Token bucket: hash {tokens, ts}. Dùng giờ của Redis (TIME) nên mọi process chung 1 đồng hồ.
+# Trả về số ms phải chờ (0 = được phép).
+TOKEN_BUCKET_LUA = r"""
+if redis.replicate_commands then redis.replicate_commands() end
+local cap  = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local s = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(s[1]) or cap
+local ts = tonumber(s[2]) or now
+tokens = math.min(cap, tokens + math.max(0, now - ts) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = math.ceil((cost - tokens) / rate * 1000)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(cap / rate * 1000) + 1000)
+return wait
+"""
+
+# Sliding log: zset các lần gọi (score = ms). Trả về số ms phải chờ (0 = được phép).
+SLIDING_LOG_LUA = r"""
+if redis.replicate_commands then redis.replicate_commands() end
+local limit  = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+if redis.call('ZCARD', KEYS[1]) < limit then
+  redis.call('ZADD', KEYS[1], now, ARGV[3])
+  redis.call('PEXPIRE', KEYS[1], window)
+  return 0
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return math.max(1, tonumber(oldest[2]) + window - now)
+"""
 
 
 class RateLimiter:
     """
-    Một lớp đơn giản để giới hạn số lần gọi trong một khoảng thời gian.
-    An toàn để sử dụng trong môi trường asyncio.
+    Giới hạn tối đa max_calls lần gọi trong period_seconds, theo từng key
+    (vd: "global" cho AI, "user:<id>", "channel:<id>").
+      - mode "token": token bucket, cho phép dồn tối đa max_calls rồi hồi dần đều
+      - mode "sliding": sliding log, không bao giờ vượt max_calls trong bất kỳ cửa sổ nào
+    Có r (redis.asyncio) thì trạng thái nằm trong Redis (script Lua, nguyên tử) nên
+    nhiều process dùng chung 1 hạn mức; lỗi Redis thì tạm dùng trạng thái trong process.
     """
 
-    def __init__(self, max_calls: int, period_seconds: int):
+    def __init__(
+        self,
+        max_calls: int,
+        period_seconds: float,
+        *,
+        mode: str = MODE_SLIDING_LOG,
+        r: Optional[Redis] = None,
+        name: str = "default",
+    ):
+        if mode not in (MODE_TOKEN_BUCKET, MODE_SLIDING_LOG):
+            raise ValueError(f"Unknown rate limit mode: {mode}")
         self.max_calls = max_calls
         self.period_seconds = period_seconds
-        self._call_count = 0
-        self._start_time = time.time()
-        self._lock = asyncio.Lock()
-
-    async def is_limited(self) -> bool:
-        async with self._lock:
-            current_time = time.time()
-
-            # Nếu đã qua khoảng thời gian giới hạn, reset lại
-            if current_time - self._start_time >= self.period_seconds:
-                self._start_time = current_time
-                self._call_count = 0
-
-            # Kiểm tra số lần gọi
-            if self._call_count >= self.max_calls:
-                return True  # Đã vượt limit, cần skip
-
-            # Nếu chưa vượt limit, tăng biến đếm và cho phép thực thi
-            self._call_count += 1
-            return False
+        self.mode = mode
+        self.name = name
+        self.r = r
+        self._script = None
+        if r is not None:
+            lua = TOKEN_BUCKET_LUA if mode == MODE_TOKEN_BUCKET else SLIDING_LOG_LUA
+            self._script = r.register_script(lua)
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, ts)
+        self._logs: Dict[str, Deque[float]] = {}  # key -> thời điểm các lần gọi
+        self._ops = 0
+
+    @property
+    def rate(self) -> float:
+        return self.max_calls / self.period_seconds
+
+    def _local_token(self, key: str, now: float) -> float:
+        tokens, ts = self._buckets.get(key, (float(self.max_calls), now))
+        tokens = min(self.max_calls, tokens + max(0.0, now - ts) * self.rate)
+        if tokens >= 1:
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+        self._buckets[key] = (tokens, now)
+        return (1 - tokens) / self.rate
+
+    def _local_sliding(self, key: str, now: float) -> float:
+        log = self._logs.setdefault(key, deque())
+        while log and log[0] <= now - self.period_seconds:
+            log.popleft()
+        if len(log) < self.max_calls:
+            log.append(now)
+            return 0.0
+        return log[0] + self.period_seconds - now
+
+    def _sweep(self, now: float) -> None:
+        # Bỏ trạng thái của các key đã nghỉ quá 1 chu kỳ (tương đương trạng thái mới)
+        cutoff = now - self.period_seconds
+        for key in [k for k, (_, ts) in self._buckets.items() if ts <= cutoff]:
+            del self._buckets[key]
+        for key in [k for k, log in self._logs.items() if not log or log[-1] <= cutoff]:
+            del self._logs[key]
+
+    def _acquire_local(self, key: str) -> float:
+        now = time.monotonic()
+        self._ops += 1
+        if self._ops % 1024 == 0:
+            self._sweep(now)
+        if self.mode == MODE_TOKEN_BUCKET:
+            return self._local_token(key, now)
+        return self._local_sliding(key, now)
+
+    async def _acquire_redis(self, key: str) -> float:
+        if self.mode == MODE_TOKEN_BUCKET:
+            args = [self.max_calls, self.rate, 1]
+        else:
+            args = [self.max_calls, int(self.period_seconds * 1000), os.urandom(8).hex()]
+        wait_ms = await self._script(keys=[K_RATELIMIT(self.name, key)], args=args)
+        return int(wait_ms) / 1000
+
+    async def acquire(self, key: str = "global") -> float:
+        """Thử lấy 1 lượt: 0 nếu được phép, ngược lại là số giây phải chờ tới lượt kế tiếp."""
+        wait = None
+        if self._script is not None:
+            try:
+                wait = await self._acquire_redis(key)
+            except Exception as e:
+                logging.warning("Rate limiter '%s': Redis lỗi, dùng giới hạn cục bộ: %s", self.name, e)
+        if wait is None:
+            wait = self._acquire_local(key)
+
+        if wait > 0:
+            RATE_LIMIT_COUNTER.labels(limiter=self.name, result="rejected").inc()
+            RATE_LIMIT_WAIT.labels(limiter=self.name).observe(wait)
+        else:
+            RATE_LIMIT_COUNTER.labels(limiter=self.name, result="allowed").inc()
+        return wait
+
+    async def is_limited(self, key: str = "global") -> bool:
+        return await self.acquire(key) > 0
@@ -0,0 +1,34 @@
+# redis_client.py
+from redis import Redis
+from redis.asyncio import BlockingConnectionPool, Redis as AsyncRedis
+from .config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    REDIS_DB,
+    REDIS_DECODE,
+    REDIS_MAX_CONNECTIONS,
+)
+
+
+def create_async_redis(max_connections: int = REDIS_MAX_CONNECTIONS) -> AsyncRedis:
+    """
+    Client redis.asyncio dùng chung cho mọi xử lý trên event loop.
+    Kết nối được mở lười trong loop đang chạy, nên có thể tạo trước bot.run().
+    Pool dạng blocking: khi hết kết nối thì lệnh chờ tới lượt thay vì báo lỗi.
+    """
+    pool = BlockingConnectionPool(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        db=REDIS_DB,
+        decode_responses=REDIS_DECODE,
+        max_connections=max_connections,
+        timeout=5,
+    )
+    return AsyncRedis(connection_pool=pool)
+
+
+def create_sync_redis() -> Redis:
+    """Client đồng bộ, chỉ cho việc nặng chạy trong thread riêng (nạp/đồng bộ từ điển)."""
+    return Redis(
+        host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB, decode_responses=REDIS_DECODE
+    )
@@ -1,9 +1,68 @@
-def K_DICT() -> str:
-    return "dict:vi"
+# Từ điển được tách theo namespace (phiên bản). "dict:vi" là namespace mặc định;
+# bản dựng mới nằm ở "dict:vi@<ver>" và K_DICT_CURRENT() trỏ tới namespace đang phục vụ.
+DICT_NS_DEFAULT = "dict:vi"
 
 
-def K_TOKEN_IDX(tok: str) -> str:
-    return f"dict:vi:tokenx:{tok}"  # index by FIRST token (with diacritics)
+def K_DICT_CURRENT() -> str:
+    return "dict:vi:current"  # pointer -> namespace of the live dictionary
+
+
+def K_DICT_RETIRED() -> str:
+    return "dict:vi:retired"  # namespaces replaced by a newer build, pending reclaim
+
+
+def K_DICT_SEQ() -> str:
+    return "dict:vi:seq"  # counter for new dictionary versions
+
+
+def K_DICT_NS(ver: str) -> str:
+    return f"{DICT_NS_DEFAULT}@{ver}"
+
+
+def K_DICT(ns: str = DICT_NS_DEFAULT) -> str:
+    return ns
+
+
+def K_TOKEN_IDX(tok: str, ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:tokenx:{tok}"  # index by FIRST token (with diacritics)
+
+
+def K_LAST_IDX(tok: str, ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:lastx:{tok}"  # index by LAST token (with diacritics)
+
+
+def K_PLAYABLE(ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:playable"  # phrases whose last token still has a continuation
+
+
+def K_DICT_FINGERPRINT(ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:fingerprint"  # sha256 of the words file loaded into this namespace
+
+
+# Word-ID (engine "bitmap"): mỗi từ có 1 ID nguyên; ID được cấp theo thứ tự token đầu
+# nên mỗi token là 1 dải ID liên tục. Từ thêm lúc chạy nằm ngoài dải -> wid_extra.
+def K_WID(ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:wid"  # hash phrase -> id
+
+
+def K_WID_REV(ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:wid_rev"  # hash id -> phrase
+
+
+def K_WID_RANGE(ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:wid_range"  # hash first_token -> "<start> <end>" (inclusive)
+
+
+def K_WID_EXTRA(tok: str, ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:wid_extra:{tok}"  # ids added after the build, by first token
+
+
+def K_WID_NEXT(ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:wid_next"  # next id to assign
+
+
+def K_WID_DEAD(ns: str = DICT_NS_DEFAULT) -> str:
+    return f"{ns}:wid_dead"  # bitmap of removed ids
 
 
 def K_LAST_WORD(gid: str) -> str:
@@ -14,16 +73,33 @@ def K_LAST_USER(gid: str) -> str:
     return f"wc:{gid}:last_user"
 
 
-def K_USED(gid: str) -> str:
-    return f"wc:{gid}:used"
+def K_EPOCH(gid: str) -> str:
+    return f"wc:{gid}:epoch"  # round counter; bumping it starts a fresh round namespace
+
+
+def K_ROUND_BASE(gid: str) -> str:
+    return f"wc:{gid}:r"
+
+
+def K_ROUND(gid: str, epoch: int) -> str:
+    # prefix of round-scoped keys (used/used_bits/used_tokenx/remainx/fails), all with a TTL
+    return f"{K_ROUND_BASE(gid)}{epoch}:"
 
 
-def K_USED_TOKEN(gid: str, tok: str) -> str:
-    return f"wc:{gid}:used_tokenx:{tok}"
+def K_USED(gid: str, epoch: int) -> str:
+    return f"{K_ROUND(gid, epoch)}used"
 
 
-def K_REMAIN(gid: str, tok: str) -> str:
-    return f"wc:{gid}:remainx:{tok}"
+def K_USED_BITS(gid: str, epoch: int) -> str:
+    return f"{K_ROUND(gid, epoch)}used_bits"  # bitmap of used word ids (engine "bitmap")
+
+
+def K_USED_TOKEN(gid: str, epoch: int, tok: str) -> str:
+    return f"{K_ROUND(gid, epoch)}used_tokenx:{tok}"
+
+
+def K_REMAIN(gid: str, epoch: int, tok: str) -> str:
+    return f"{K_ROUND(gid, epoch)}remainx:{tok}"
 
 
 def K_WINNER(gid: str) -> str:
@@ -38,9 +114,21 @@ def K_PAUSED(gid: str) -> str:
     return f"wc:{gid}:paused"
 
 
-def K_FAILS(gid: str, word: str) -> str:
-    return f"wc:{gid}:fails:{word}"
+def K_FAILS(gid: str, epoch: int, word: str) -> str:
+    return f"{K_ROUND(gid, epoch)}fails:{word}"
+
+
+def K_COOLDOWN(gid: str) -> str:
+    return f"COOLDOWN:{gid}"
 
 
 def K_BLACKLIST() -> str:
     return f"dict:blacklist"
+
+
+def K_AI_VERDICT(word: str) -> str:
+    return f"ai:verdict:{word}"
+
+
+def K_RATELIMIT(name: str, key: str) -> str:
+    return f"rl:{name}:{key}"  # token bucket (hash) / sliding log (zset), with a TTL
@@ -1,256 +1,544 @@
-from typing import Optional, Dict, Any
-from redis import Redis
-from .config import Fail_Limit
+import random
+from typing import Optional, Dict, Any, List, Tuple
+from redis.asyncio import Redis
+from .config import Fail_Limit, REFEREE_ENGINE
 from .utils_vi import norm_phrase, first_token, last_token
+from .dictionary import current_ns_async
 from .redis_keys import (
+    DICT_NS_DEFAULT,
+    K_DICT_CURRENT,
     K_DICT,
     K_TOKEN_IDX,
+    K_PLAYABLE,
     K_LAST_WORD,
     K_LAST_USER,
+    K_EPOCH,
+    K_ROUND_BASE,
     K_USED,
     K_USED_TOKEN,
     K_REMAIN,
     K_WINNER,
     K_ENDED,
     K_PAUSED,
-    K_FAILS,
+    K_COOLDOWN,
+    K_USED_BITS,
+    K_WID,
 )
 
+# Key theo ván (used/remain/fails...) tự hết hạn sau chừng này giây không được ghi
+ROUND_TTL = 3 * 24 * 3600
+
+# Script chấm 1 lượt (atomic). Token của từ mới (ft/lt) được tính sẵn bên Python,
+# token cuối của last_word tính lại trong Lua theo đúng quy tắc utils_vi.last_token.
+# Namespace từ điển đọc từ con trỏ dict_current (blue/green); key của ván hiện tại
+# là "<round_base><epoch>:<suffix>" (xem K_ROUND) và luôn được gắn TTL ROUND_TTL.
+# Script ghép từ 3 phần: phần chung + phần "engine" (in_dict/is_used/mark_used/
+# has_continuation) + luồng chấm.
+# KEYS: ended, winner, paused, last_word, last_user, epoch, cooldown, dict_current
+# ARGV: phrase, ft, lt, user_id, fail_limit, round_base, default_dict_ns, round_ttl
+# Trả về: {ok, ended, winner, msg, cooldown_left}
+_SUBMIT_COMMON_LUA = r"""
+local K_ENDED, K_WINNER, K_PAUSED = KEYS[1], KEYS[2], KEYS[3]
+local K_LAST_WORD, K_LAST_USER = KEYS[4], KEYS[5]
+local K_COOLDOWN = KEYS[7]
+local NS = redis.call("GET", KEYS[8]) or ARGV[7]
+local ROUND = ARGV[6] .. (redis.call("GET", KEYS[6]) or "0") .. ":"
+local TTL = tonumber(ARGV[8])
+local phrase, ft, lt, user_id = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+local fail_limit = tonumber(ARGV[5])
+local P_FAILS = ROUND .. "fails:"
+
+local function fail(word)
+  local n = redis.call("INCR", P_FAILS .. word)
+  redis.call("EXPIRE", P_FAILS .. word, TTL)
+  return n
+end
+
+local PUNCT = {".", ",", ";", ":", "!", "?", "\"", "'", "(", ")", "[", "]",
+               "{", "}", "\226\128\166", "\226\128\147", "\226\128\148", "-", "/"}
+
+local function clean(tok)
+  local changed = true
+  while changed and #tok > 0 do
+    changed = false
+    for _, p in ipairs(PUNCT) do
+      if #tok >= #p and tok:sub(1, #p) == p then
+        tok = tok:sub(#p + 1)
+        changed = true
+      end
+      if #tok >= #p and tok:sub(-#p) == p then
+        tok = tok:sub(1, #tok - #p)
+        changed = true
+      end
+    end
+  end
+  return tok
+end
+
+local function last_token(s)
+  local found = nil
+  for t in string.gmatch(s, "[^ ]+") do
+    local c = clean(t)
+    if #c > 0 then found = c end
+  end
+  return found
+end
+
+local function win(uid, word, cooldown)
+  redis.call("SET", K_WINNER, uid)
+  redis.call("SET", K_ENDED, "1")
+  local items = redis.call("HGETALL", K_COOLDOWN)
+  for i = 1, #items, 2 do
+    local k = items[i]
+    if k ~= word then
+      local left = tonumber(items[i + 1]) - 1
+      if left <= 0 then
+        redis.call("HDEL", K_COOLDOWN, k)
+      else
+        redis.call("HSET", K_COOLDOWN, k, left)
+      end
+    end
+  end
+  redis.call("HSET", K_COOLDOWN, word, cooldown)
+end
+"""
+
+# Engine "set": used là tập từ; remainx:<tok> = tokenx:<tok> - used_tokenx:<tok>
+_SET_ENGINE_LUA = r"""
+local K_USED, P_USED_TOKEN, P_REMAIN = ROUND .. "used", ROUND .. "used_tokenx:", ROUND .. "remainx:"
+local P_TOKEN_IDX = NS .. ":tokenx:"
+
+local function in_dict()
+  return redis.call("SISMEMBER", NS, phrase) == 1
+end
+
+local function is_used()
+  return redis.call("SISMEMBER", K_USED, phrase) == 1
+end
+
+local function mark_used()
+  redis.call("SADD", K_USED, phrase)
+  redis.call("EXPIRE", K_USED, TTL)
+  if ft ~= "" then
+    redis.call("SADD", P_USED_TOKEN .. ft, phrase)
+    redis.call("EXPIRE", P_USED_TOKEN .. ft, TTL)
+    redis.call("SREM", P_REMAIN .. ft, phrase)
+  end
+end
+
+local function has_continuation(tok)
+  local rkey = P_REMAIN .. tok
+  if redis.call("EXISTS", rkey) == 0 then
+    redis.call("SUNIONSTORE", rkey, P_TOKEN_IDX .. tok)
+    redis.call("SDIFFSTORE", rkey, rkey, P_USED_TOKEN .. tok)
+    redis.call("EXPIRE", rkey, TTL)
+  end
+  return redis.call("SCARD", rkey) > 0
+end
+"""
+
+# Engine "bitmap": used là bitmap theo Word-ID; còn nước đi = dải ID của token
+# chưa bị đánh dấu hết (BITCOUNT ... BIT, Redis >= 7.0) hoặc còn ID thêm sau.
+_BITMAP_ENGINE_LUA = r"""
+local K_USED = ROUND .. "used_bits"
+local K_WID, K_WID_RANGE, P_WID_EXTRA = NS .. ":wid", NS .. ":wid_range", NS .. ":wid_extra:"
+local wid = false
+
+local function in_dict()
+  wid = redis.call("HGET", K_WID, phrase)
+  return wid ~= false
+end
+
+local function is_used()
+  return redis.call("GETBIT", K_USED, wid) == 1
+end
+
+local function mark_used()
+  redis.call("SETBIT", K_USED, wid, 1)
+  redis.call("EXPIRE", K_USED, TTL)
+end
+
+local function has_continuation(tok)
+  local rng = redis.call("HGET", K_WID_RANGE, tok)
+  if rng then
+    local s, e = string.match(rng, "(%d+) (%d+)")
+    s, e = tonumber(s), tonumber(e)
+    if (e - s + 1) - redis.call("BITCOUNT", K_USED, s, e, "BIT") > 0 then
+      return true
+    end
+  end
+  for _, id in ipairs(redis.call("SMEMBERS", P_WID_EXTRA .. tok)) do
+    if redis.call("GETBIT", K_USED, id) == 0 then
+      return true
+    end
+  end
+  return false
+end
+"""
+
+_SUBMIT_FLOW_LUA = r"""
+-- Không được nối 2 từ liên tiếp: kiểm tra ngay trong script nên thứ tự chấm của
+-- SubmitActor quyết định, 2 tin gửi sát nhau của cùng 1 người không lọt cả 2
+local prev_user = redis.call("GET", K_LAST_USER)
+if prev_user and prev_user ~= "BOT" and prev_user == user_id then
+  return {0, 0, false, "SAME_USER", false}
+end
+if redis.call("GET", K_ENDED) == "1" then
+  return {0, 1, redis.call("GET", K_WINNER), "ENDED", false}
+end
+if redis.call("GET", K_PAUSED) == "1" then
+  return {0, 0, false, "PAUSED", false}
+end
+
+local last = redis.call("GET", K_LAST_WORD)
+
+if not in_dict() then
+  if last then
+    local n = fail(last)
+    if n >= fail_limit then
+      if prev_user and prev_user ~= "BOT" then
+        win(prev_user, last, 5)
+        return {0, 1, prev_user, "FAIL_LIMIT_REACHED", false}
+      end
+    end
+  end
+  return {0, 0, false, "NOT_IN_DICT", false}
+end
+if is_used() then
+  return {0, 0, false, "USED", false}
+end
+local left = redis.call("HGET", K_COOLDOWN, phrase)
+if left then
+  return {0, 0, false, "COOLDOWN", tonumber(left)}
+end
+
+if last then
+  local need_tok = last_token(last)
+  if not need_tok or ft == "" or need_tok ~= ft then
+    fail(last)
+    return {0, 0, false, "RULE_MISMATCH", false}
+  end
+end
+
+redis.call("SET", K_LAST_WORD, phrase)
+redis.call("SET", K_LAST_USER, user_id)
+mark_used()
+if last then
+  redis.call("DEL", P_FAILS .. last)
+end
+
+if lt == "" or not has_continuation(lt) then
+  win(user_id, phrase, 3)
+  return {1, 1, user_id, "WIN", false}
+end
+
+return {1, 0, false, "OK", false}
+"""
+
+SUBMIT_LUA = _SUBMIT_COMMON_LUA + _SET_ENGINE_LUA + _SUBMIT_FLOW_LUA
+SUBMIT_BITMAP_LUA = _SUBMIT_COMMON_LUA + _BITMAP_ENGINE_LUA + _SUBMIT_FLOW_LUA
+
+# Script mở ván mới (atomic): tăng epoch, xoá winner/ended, đặt từ mở đầu và đánh dấu
+# nó đã dùng trong ván mới. Không có khoảng nào ván mới chưa có last_word để 1 lượt
+# submit chen vào như "nước đi đầu tự do". Dùng lại phần engine của script chấm.
+# KEYS: epoch, last_word, last_user, winner, ended
+# ARGV: opening ("" = không có từ mở đầu), ft, lt, round_base, dict_ns, round_ttl
+# Trả về: epoch mới
+_START_COMMON_LUA = r"""
+local epoch = redis.call("INCR", KEYS[1])
+local ROUND = ARGV[4] .. epoch .. ":"
+local NS = ARGV[5]
+local TTL = tonumber(ARGV[6])
+local phrase, ft, lt = ARGV[1], ARGV[2], ARGV[3]
+redis.call("DEL", KEYS[2], KEYS[3], KEYS[4], KEYS[5])
+"""
+
+# Engine "set": pre-warm remain cho token cuối để lượt sau check nhanh
+_SET_OPEN_LUA = r"""
+local function open_round()
+  mark_used()
+  if lt ~= "" then
+    has_continuation(lt)
+  end
+end
+"""
+
+# Engine "bitmap": từ đã bị xoá khỏi từ điển coi như đã dùng
+_BITMAP_OPEN_LUA = r"""
+local function open_round()
+  redis.call("BITOP", "OR", K_USED, NS .. ":wid_dead")
+  if in_dict() then
+    mark_used()
+  else
+    redis.call("EXPIRE", K_USED, TTL)
+  end
+end
+"""
+
+_START_FLOW_LUA = r"""
+if phrase ~= "" then
+  redis.call("SET", KEYS[2], phrase)
+  redis.call("SET", KEYS[3], "BOT")
+  open_round()
+end
+return epoch
+"""
+
+START_ROUND_LUA = _START_COMMON_LUA + _SET_ENGINE_LUA + _SET_OPEN_LUA + _START_FLOW_LUA
+START_ROUND_BITMAP_LUA = _START_COMMON_LUA + _BITMAP_ENGINE_LUA + _BITMAP_OPEN_LUA + _START_FLOW_LUA
+
+# Gợi ý cho engine "bitmap": ID chưa dùng trong dải của token (bắt đầu từ vị trí ngẫu nhiên)
+# KEYS: used_bits, dict_current ; ARGV: tok, default_dict_ns, random_offset
+HINT_BITMAP_LUA = r"""
+local NS = redis.call("GET", KEYS[2]) or ARGV[2]
+local K_USED, tok, offset = KEYS[1], ARGV[1], tonumber(ARGV[3])
+local K_WID_REV = NS .. ":wid_rev"
+local rng = redis.call("HGET", NS .. ":wid_range", tok)
+if rng then
+  local s, e = string.match(rng, "(%d+) (%d+)")
+  s, e = tonumber(s), tonumber(e)
+  local size = e - s + 1
+  for i = 0, size - 1 do
+    local id = s + (offset + i) % size
+    if redis.call("GETBIT", K_USED, id) == 0 then
+      local phrase = redis.call("HGET", K_WID_REV, id)
+      if phrase then return phrase end
+    end
+  end
+end
+for _, id in ipairs(redis.call("SMEMBERS", NS .. ":wid_extra:" .. tok)) do
+  if redis.call("GETBIT", K_USED, id) == 0 then
+    local phrase = redis.call("HGET", K_WID_REV, id)
+    if phrase then return phrase end
+  end
+end
+return false
+"""
+
 
 class WordChainRefereeByLastWordExact:
     """Referee for Vietnamese word-chain (connect by LAST WORD, with diacritics)."""
 
+    submit_lua = SUBMIT_LUA
+    start_lua = START_ROUND_LUA
+
     def __init__(self, r: Redis, game_id: str):
         self.r = r
         self.gid = game_id
         self.fail_limit = Fail_Limit
+        self._submit_script = r.register_script(self.submit_lua)
+        self._start_script = r.register_script(self.start_lua)
 
-    def start_round_random(self) -> Optional[str]:
+    async def start_round_random(self) -> Optional[str]:
         """
         Mở ván mới với 1 từ random NHƯNG đảm bảo có nước đi tiếp theo:
-        chọn 'opening' sao cho scard(dict:vi:tokenx:<last_token(opening)>) > 0.
+        lấy từ tập dict:vi:playable (duy trì sẵn lúc nạp/thêm/xoá từ) nên chỉ cần 1 SRANDMEMBER.
+        Chọn từ trước, rồi reset + đặt từ mở đầu trong 1 script (START_ROUND_LUA).
+        State của ván cũ không cần xoá: tăng epoch là mọi key theo ván đổi tên,
+        key cũ tự hết hạn theo ROUND_TTL. Chi phí reset không phụ thuộc kích thước keyspace.
         """
-        # reset state cũ
-        self.r.delete(
-            K_LAST_WORD(self.gid),
-            K_LAST_USER(self.gid),
-            K_USED(self.gid),
-            K_WINNER(self.gid),
-            K_ENDED(self.gid),
+        ns = await current_ns_async(self.r)
+        opening = await self.r.srandmember(K_PLAYABLE(ns)) or ""
+        epoch = await self._start_script(
+            keys=[
+                K_EPOCH(self.gid),
+                K_LAST_WORD(self.gid),
+                K_LAST_USER(self.gid),
+                K_WINNER(self.gid),
+                K_ENDED(self.gid),
+            ],
+            args=[
+                opening,
+                first_token(opening) or "",
+                last_token(opening) or "",
+                K_ROUND_BASE(self.gid),
+                ns,
+                ROUND_TTL,
+            ],
+        )
+        if epoch == 1:
+            # Lần đầu có epoch: dọn key ván kiểu cũ (không theo epoch, không TTL)
+            await self._drop_legacy_round_keys()
+        # Không tìm được gì -> None
+        return opening or None
+
+    async def _drop_legacy_round_keys(self) -> None:
+        patterns = (
+            f"wc:{self.gid}:used",
+            f"wc:{self.gid}:used_tokenx:*",
+            f"wc:{self.gid}:remainx:*",
+            f"wc:{self.gid}:fails:*",
         )
-        self._wipe_prefix(f"wc:{self.gid}:remainx:*")
-        self._wipe_prefix(f"wc:{self.gid}:used_tokenx:*")
-        self._wipe_prefix(f"wc:{self.gid}:fails:*")
-        # Thử ngẫu nhiên trước (nhanh)
-        tried = set()
-        for _ in range(256):  # thử tối đa 256 lần
-            opening = self.r.srandmember(K_DICT())
-            if not opening:
-                break
-            if opening in tried:
-                continue
-            tried.add(opening)
-
-            next_tok = last_token(opening)  # CÓ DẤU
-            if not next_tok:
-                continue
-
-            # Có ít nhất 1 ứng viên bắt đầu bằng next_tok?
-            if self.r.scard(K_TOKEN_IDX(next_tok)) > 0:
-                # Chọn được opening hợp lệ
-                ft = first_token(opening)
-                pipe = self.r.pipeline()
-                pipe.set(K_LAST_WORD(self.gid), opening)
-                pipe.set(K_LAST_USER(self.gid), "BOT")
-                pipe.sadd(K_USED(self.gid), opening)
-                if ft:
-                    pipe.sadd(K_USED_TOKEN(self.gid, ft), opening)
-                    pipe.srem(K_REMAIN(self.gid, ft), opening)
-                pipe.delete(K_WINNER(self.gid), K_ENDED(self.gid))
-                # Pre-warm remain cho next_tok để lượt sau check nhanh
-                pipe.sunionstore(K_REMAIN(self.gid, next_tok), K_TOKEN_IDX(next_tok))
-                pipe.sdiffstore(
-                    K_REMAIN(self.gid, next_tok),
-                    K_REMAIN(self.gid, next_tok),
-                    K_USED_TOKEN(self.gid, next_tok),
-                )
-                pipe.execute()
-                return opening
-
-        # Fallback: SCAN dict để kiếm 1 opening hợp lệ (chắc chắn có nước)
-        cursor = 0
-        while True:
-            cursor, chunk = self.r.sscan(K_DICT(), cursor=cursor, count=2000)
-            for opening in chunk:
-                if opening in tried:
-                    continue
-                next_tok = last_token(opening)
-                if next_tok and self.r.scard(K_TOKEN_IDX(next_tok)) > 0:
-                    ft = first_token(opening)
-                    pipe = self.r.pipeline()
-                    pipe.set(K_LAST_WORD(self.gid), opening)
-                    pipe.set(K_LAST_USER(self.gid), "BOT")
-                    pipe.sadd(K_USED(self.gid), opening)
-                    if ft:
-                        pipe.sadd(K_USED_TOKEN(self.gid, ft), opening)
-                        pipe.srem(K_REMAIN(self.gid, ft), opening)
-                    pipe.delete(K_WINNER(self.gid), K_ENDED(self.gid))
-                    pipe.sunionstore(
-                        K_REMAIN(self.gid, next_tok), K_TOKEN_IDX(next_tok)
-                    )
-                    pipe.sdiffstore(
-                        K_REMAIN(self.gid, next_tok),
-                        K_REMAIN(self.gid, next_tok),
-                        K_USED_TOKEN(self.gid, next_tok),
-                    )
-                    pipe.execute()
-                    return opening
-            if cursor == 0:
-                break
-
-        # Không tìm được gì
-        return None
-
-    def submit(self, user_id: str, raw_phrase: str) -> Dict[str, Any]:
-        if self.r.get(K_ENDED(self.gid)) == "1":
-            return {
-                "ok": False,
-                "ended": True,
-                "winner": self.r.get(K_WINNER(self.gid)),
-                "msg": "ENDED",
-            }
-        if self.r.get(K_PAUSED(self.gid)) == "1":
-            return {"ok": False, "ended": False, "winner": None, "msg": "PAUSED"}
-
-        last = self.r.get(K_LAST_WORD(self.gid))
+        for pattern in patterns:
+            batch = []
+            async for key in self.r.scan_iter(match=pattern, count=500):
+                batch.append(key)
+                if len(batch) >= 500:
+                    await self.r.unlink(*batch)
+                    batch = []
+            if batch:
+                await self.r.unlink(*batch)
+
+    def _submit_call(self, user_id: str, raw_phrase: str) -> Dict[str, list]:
         phrase = norm_phrase(raw_phrase)
-        cooldown_key = f"COOLDOWN:{self.gid}"
-
-        if not self.r.sismember(K_DICT(), phrase):
-            if last:
-                new_count = self.r.incr(K_FAILS(self.gid, last))
-                if new_count >= self.fail_limit:
-                    last_successful_user = self.r.get(K_LAST_USER(self.gid))
-                    if last_successful_user and last_successful_user != "BOT":
-                        self._win(last_successful_user)
-                        if last:
-                            cooldown_items = self.r.hgetall(cooldown_key)
-                            for k, v in cooldown_items.items():
-                                if k != last:
-                                    remaining_wins = int(v) - 1
-                                    if remaining_wins <= 0:
-                                        self.r.hdel(cooldown_key, k)
-                                    else:
-                                        self.r.hset(cooldown_key, k, remaining_wins)
-                            self.r.hset(cooldown_key, last, 5)
-                        return {
-                            "ok": False,
-                            "ended": True,
-                            "winner": last_successful_user,
-                            "msg": "FAIL_LIMIT_REACHED",
-                        }
-            return {"ok": False, "ended": False, "winner": None, "msg": "NOT_IN_DICT"}
-        if self.r.sismember(K_USED(self.gid), phrase):
-            return {"ok": False, "ended": False, "winner": None, "msg": "USED"}
-
-        if self.r.hexists(cooldown_key, phrase):
-            left = int(self.r.hget(cooldown_key, phrase))
-            return {
-                "ok": False,
-                "ended": False,
-                "winner": None,
-                "msg": "COOLDOWN",
-                "cooldown_left": left,
-            }
-
-        if last:
-            need_tok = last_token(last)
-            got_tok = first_token(phrase)
-            if not need_tok or not got_tok or need_tok != got_tok:
-                self.r.incr(K_FAILS(self.gid, last))
-                return {
-                    "ok": False,
-                    "ended": False,
-                    "winner": None,
-                    "msg": "RULE_MISMATCH",
-                }
+        return dict(
+            keys=[
+                K_ENDED(self.gid),
+                K_WINNER(self.gid),
+                K_PAUSED(self.gid),
+                K_LAST_WORD(self.gid),
+                K_LAST_USER(self.gid),
+                K_EPOCH(self.gid),
+                K_COOLDOWN(self.gid),
+                K_DICT_CURRENT(),
+            ],
+            args=[
+                phrase,
+                first_token(phrase) or "",
+                last_token(phrase) or "",
+                user_id,
+                self.fail_limit,
+                K_ROUND_BASE(self.gid),
+                DICT_NS_DEFAULT,
+                ROUND_TTL,
+            ],
+        )
+
+    @staticmethod
+    def _submit_result(raw) -> Dict[str, Any]:
+        ok, ended, winner, msg, cooldown_left = raw
+        res = {
+            "ok": bool(ok),
+            "ended": bool(ended),
+            "winner": winner,
+            "msg": msg,
+        }
+        if cooldown_left is not None:
+            res["cooldown_left"] = int(cooldown_left)
+        return res
+
+    async def submit(self, user_id: str, raw_phrase: str) -> Dict[str, Any]:
+        """
+        Chấm 1 lượt trong MỘT round trip: toàn bộ logic chạy trong script Lua
+        (nạp 1 lần, gọi bằng EVALSHA) nên 2 người gửi cùng lúc không thể chen ngang nhau.
+        """
+        raw = await self._submit_script(**self._submit_call(user_id, raw_phrase))
+        return self._submit_result(raw)
+
+    async def submit_many(self, turns: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Chấm nhiều lượt (user_id, raw_phrase) theo đúng thứ tự, gộp trong 1 pipeline.
+        Mỗi lượt vẫn là 1 EVALSHA atomic nên kết quả y hệt gọi submit() lần lượt.
+        """
+        if len(turns) == 1:
+            return [await self.submit(*turns[0])]
+        pipe = self.r.pipeline(transaction=False)
+        for user_id, raw_phrase in turns:
+            await self._submit_script(**self._submit_call(user_id, raw_phrase), client=pipe)
+        return [self._submit_result(raw) for raw in await pipe.execute()]
+
+    async def _epoch(self) -> int:
+        return int(await self.r.get(K_EPOCH(self.gid)) or 0)
 
+    async def note_added(self, phrase: str) -> None:
+        """Từ vừa được thêm vào từ điển: cho phép dùng ngay trong ván đang chạy."""
         ft = first_token(phrase)
         pipe = self.r.pipeline()
-        pipe.set(K_LAST_WORD(self.gid), phrase)
-        pipe.set(K_LAST_USER(self.gid), user_id)
-        pipe.sadd(K_USED(self.gid), phrase)
-        if ft:
-            pipe.sadd(K_USED_TOKEN(self.gid, ft), phrase)
-            pipe.srem(K_REMAIN(self.gid, ft), phrase)
-        pipe.execute()
-        if last:
-            self.r.delete(K_FAILS(self.gid, last))
-        next_need_tok = last_token(phrase)
-        if not next_need_tok:
-            self._win(user_id)
-            cooldown_items = self.r.hgetall(cooldown_key)
-            for k, v in cooldown_items.items():
-                if k != phrase:
-                    remaining_wins = int(v) - 1
-                    if remaining_wins <= 0:
-                        self.r.hdel(cooldown_key, k)
-                    else:
-                        self.r.hset(cooldown_key, k, remaining_wins)
-            self.r.hset(cooldown_key, phrase, 3)
-            return {"ok": True, "ended": True, "winner": user_id, "msg": "WIN"}
-
-        self._ensure_remain(next_need_tok)
-        if self.r.scard(K_REMAIN(self.gid, next_need_tok)) == 0:
-            self._win(user_id)
-            cooldown_items = self.r.hgetall(cooldown_key)
-            for k, v in cooldown_items.items():
-                if k != phrase:
-                    remaining_wins = int(v) - 1
-                    if remaining_wins <= 0:
-                        self.r.hdel(cooldown_key, k)
-                    else:
-                        self.r.hset(cooldown_key, k, remaining_wins)
-            self.r.hset(cooldown_key, phrase, 3)
-            return {"ok": True, "ended": True, "winner": user_id, "msg": "WIN"}
-
-        return {"ok": True, "ended": False, "winner": None, "msg": "OK"}
-
-    def get_hint(self) -> Optional[str]:
-        if self.r.get(K_ENDED(self.gid)) == "1":
+        pipe.get(K_EPOCH(self.gid))
+        pipe.get(K_LAST_WORD(self.gid))
+        epoch, last = await pipe.execute()
+        epoch = int(epoch or 0)
+        need_tok = last_token(last) if last else None
+        if need_tok == ft:
+            used_key = K_USED_TOKEN(self.gid, epoch, ft)
+            rem_key = K_REMAIN(self.gid, epoch, ft)
+            if await self.r.exists(rem_key) and not await self.r.sismember(used_key, phrase):
+                await self.r.sadd(rem_key, phrase)
+
+    async def note_removed(self, phrase: str) -> None:
+        """Từ sắp bị xoá khỏi từ điển: rút khỏi state của ván đang chạy."""
+        ft = first_token(phrase)
+        if not ft:
+            return
+        epoch = await self._epoch()
+        pipe = self.r.pipeline()
+        pipe.srem(K_REMAIN(self.gid, epoch, ft), phrase)
+        pipe.srem(K_USED_TOKEN(self.gid, epoch, ft), phrase)
+        await pipe.execute()
+
+    async def _hint_state(self) -> tuple[Optional[str], int, str]:
+        """(last_word, epoch, ns) nếu ván đang chạy; last_word = "" nếu chưa có từ nào."""
+        pipe = self.r.pipeline()
+        pipe.get(K_ENDED(self.gid))
+        pipe.get(K_LAST_WORD(self.gid))
+        pipe.get(K_EPOCH(self.gid))
+        pipe.get(K_DICT_CURRENT())
+        ended, last, epoch, ns = await pipe.execute()
+        if ended == "1":
+            return None, 0, ""
+        return last or "", int(epoch or 0), ns or DICT_NS_DEFAULT
+
+    async def get_hint(self) -> Optional[str]:
+        last, epoch, ns = await self._hint_state()
+        if last is None:
             return None
-        last = self.r.get(K_LAST_WORD(self.gid))
         if not last:
-            return self.r.srandmember(K_DICT())
+            return await self.r.srandmember(K_DICT(ns))
         need_tok = last_token(last)
         if not need_tok:
             return None
-        rkey = K_REMAIN(self.gid, need_tok)
-        if not self.r.exists(rkey):
+        rkey = K_REMAIN(self.gid, epoch, need_tok)
+        if not await self.r.exists(rkey):
             pipe = self.r.pipeline()
-            pipe.sunionstore(rkey, K_TOKEN_IDX(need_tok))
-            pipe.sdiffstore(rkey, rkey, K_USED_TOKEN(self.gid, need_tok))
-            pipe.execute()
-        return self.r.srandmember(rkey)
-
-    def _ensure_remain(self, tok: str):
-        rkey = K_REMAIN(self.gid, tok)
-        if self.r.exists(rkey):
-            return
-        pipe = self.r.pipeline()
-        pipe.sunionstore(rkey, K_TOKEN_IDX(tok))
-        pipe.sdiffstore(rkey, rkey, K_USED_TOKEN(self.gid, tok))
-        pipe.execute()
-
-    def _win(self, user_id: str):
-        self.r.set(K_WINNER(self.gid), user_id)
-        self.r.set(K_ENDED(self.gid), "1")
-
-    def _wipe_prefix(self, pattern: str):
-        cursor = 0
-        while True:
-            cursor, keys = self.r.scan(cursor=cursor, match=pattern, count=500)
-            if keys:
-                self.r.delete(*keys)
-            if cursor == 0:
-                break
+            pipe.sunionstore(rkey, K_TOKEN_IDX(need_tok, ns))
+            pipe.sdiffstore(rkey, rkey, K_USED_TOKEN(self.gid, epoch, need_tok))
+            pipe.expire(rkey, ROUND_TTL)
+            await pipe.execute()
+        return await self.r.srandmember(rkey)
+
+
+class WordChainRefereeBitmap(WordChainRefereeByLastWordExact):
+    """
+    Engine "bitmap": state mỗi ván là 1 bitmap theo Word-ID thay vì copy tập từ.
+    Cần từ điển dựng kèm Word-ID (with_ids=True) và Redis >= 7.0.
+    """
+
+    submit_lua = SUBMIT_BITMAP_LUA
+    start_lua = START_ROUND_BITMAP_LUA
+
+    def __init__(self, r: Redis, game_id: str):
+        super().__init__(r, game_id)
+        self._hint_script = r.register_script(HINT_BITMAP_LUA)
+
+    async def note_added(self, phrase: str) -> None:
+        # ID mới chưa được đánh dấu trong bitmap -> dùng được ngay, không cần làm gì
+        return
+
+    async def note_removed(self, phrase: str) -> None:
+        wid = await self.r.hget(K_WID(await current_ns_async(self.r)), norm_phrase(phrase))
+        if wid is not None:
+            used = K_USED_BITS(self.gid, await self._epoch())
+            pipe = self.r.pipeline()
+            pipe.setbit(used, int(wid), 1)
+            pipe.expire(used, ROUND_TTL)
+            await pipe.execute()
+
+    async def get_hint(self) -> Optional[str]:
+        last, epoch, ns = await self._hint_state()
+        if last is None:
+            return None
+        if not last:
+            return await self.r.srandmember(K_DICT(ns))
+        need_tok = last_token(last)
+        if not need_tok:
+            return None
+        return await self._hint_script(
+            keys=[K_USED_BITS(self.gid, epoch), K_DICT_CURRENT()],
+            args=[need_tok, DICT_NS_DEFAULT, random.randrange(1 << 30)],
+        )
+
+
+def create_referee(r: Redis, game_id: str, engine: str = REFEREE_ENGINE) -> WordChainRefereeByLastWordExact:
+    if engine == "bitmap":
+        return WordChainRefereeBitmap(r, game_id)
+    return WordChainRefereeByLastWordExact(r, game_id)
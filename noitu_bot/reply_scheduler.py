@@ -0,0 +1,98 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import discord
+
+try:
+    from .monitoring_server import CHAT_REPLY_QUEUE_DEPTH, CHAT_REPLY_DROPPED
+except ImportError:
+    class DummyMetric:
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self):
+            pass
+
+        def set(self, *args, **kwargs):
+            pass
+
+
+    CHAT_REPLY_QUEUE_DEPTH = DummyMetric()
+    CHAT_REPLY_DROPPED = DummyMetric()
+
+ReplyHandler = Callable[[discord.Message], Awaitable[None]]
+
+
+class ReplyScheduler:
+    """
+    Hàng đợi trả lời chat (cà khịa) có giới hạn:
+      - mỗi kênh 1 hàng đợi tối đa per_channel tin, 1 worker xử lý lần lượt
+        (worker tự dừng khi hết tin, tạo lại ở tin kế tiếp như SubmitActor)
+      - mỗi người chỉ giữ tin MỚI NHẤT đang chờ (tin cũ hơn bị gộp/bỏ)
+      - hàng đợi đầy -> bỏ tin cũ nhất; tin chờ quá max_age giây -> bỏ
+      - toàn bộ kênh dùng chung max_concurrency lời gọi AI cùng lúc
+    Nhờ vậy raid/spam không sinh ra vô hạn task, typing indicator và lời gọi AI.
+    """
+
+    def __init__(
+        self,
+        handler: ReplyHandler,
+        *,
+        max_concurrency: int = 4,
+        per_channel: int = 5,
+        max_age: float = 60.0,
+    ):
+        self.handler = handler
+        self.per_channel = per_channel
+        self.max_age = max_age
+        self._slots = asyncio.Semaphore(max_concurrency)
+        # channel_id -> {user_id: (thời điểm nhận, message)}, theo thứ tự nhận
+        self._queues: Dict[int, "OrderedDict[int, Tuple[float, discord.Message]]"] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._depth = 0
+
+    def _set_depth(self, delta: int) -> None:
+        self._depth += delta
+        CHAT_REPLY_QUEUE_DEPTH.set(self._depth)
+
+    def submit(self, message: discord.Message) -> None:
+        cid, uid = message.channel.id, message.author.id
+        queue = self._queues.setdefault(cid, OrderedDict())
+        if uid in queue:
+            del queue[uid]
+            self._set_depth(-1)
+            CHAT_REPLY_DROPPED.labels(reason="merged").inc()
+        elif len(queue) >= self.per_channel:
+            queue.popitem(last=False)
+            self._set_depth(-1)
+            CHAT_REPLY_DROPPED.labels(reason="overflow").inc()
+        queue[uid] = (time.monotonic(), message)
+        self._set_depth(1)
+
+        worker = self._workers.get(cid)
+        if worker is None or worker.done():
+            self._workers[cid] = asyncio.create_task(self._run(cid))
+
+    def _next(self, cid: int) -> Optional[discord.Message]:
+        queue = self._queues.get(cid)
+        while queue:
+            _, (queued_at, message) = queue.popitem(last=False)
+            self._set_depth(-1)
+            if time.monotonic() - queued_at <= self.max_age:
+                return message
+            CHAT_REPLY_DROPPED.labels(reason="stale").inc()
+        self._queues.pop(cid, None)
+        return None
+
+    async def _run(self, cid: int) -> None:
+        while True:
+            async with self._slots:
+                message = self._next(cid)
+                if message is None:
+                    return
+                try:
+                    await self.handler(message)
+                except Exception as e:
+                    logging.error(f"Lỗi khi trả lời chat ở kênh {cid}: {e}")
@@ -0,0 +1,195 @@
+# stats_store.py
+from __future__ import annotations
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id        TEXT PRIMARY KEY,
+    name           TEXT NOT NULL,
+    wins           INTEGER NOT NULL DEFAULT 0,
+    correct_words  INTEGER NOT NULL DEFAULT 0,
+    total_attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_users_wins ON users (wins DESC, name);
+-- Số trận thắng theo kỳ ("d:2026-10-18", "w:2026-W42", "m:2026-10"), cộng dồn lúc thắng
+CREATE TABLE IF NOT EXISTS period_wins (
+    period  TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    wins    INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (period, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_period_wins ON period_wins (period, wins DESC);
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_COLUMNS = "user_id, name, wins, correct_words, total_attempts"
+
+
+class StatsStore:
+    """
+    Thống kê người chơi trong SQLite (WAL): lượt đánh được cộng theo lô (add_attempts),
+    mỗi người chơi 1 UPSERT; top-N là 1 truy vấn theo index (wins DESC, name).
+    Dùng 1 connection + lock nên gọi an toàn từ nhiều thread (asyncio.to_thread).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def add_attempts(self, deltas: Dict[str, Tuple[int, int]]) -> None:
+        """Cộng dồn nhiều người chơi 1 lần: {user_id: (total_attempts, correct_words)}."""
+        rows = [(uid, f"UID:{uid}", correct, attempts) for uid, (attempts, correct) in deltas.items()]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO users (user_id, name, correct_words, total_attempts) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET "
+                    "total_attempts = total_attempts + excluded.total_attempts, "
+                    "correct_words = correct_words + excluded.correct_words",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def record_win(self, user_id: str, display_name: Optional[str], periods: Iterable[str] = ()) -> int:
+        """
+        Cộng 1 trận thắng (và cập nhật tên nếu có) vào tổng và vào từng kỳ trong periods,
+        trong cùng 1 transaction; đồng thời xoá các kỳ cũ hơn kỳ hiện tại cùng loại
+        (khoá kỳ so sánh được theo thứ tự chuỗi). Trả về tổng số trận thắng.
+        """
+        periods = list(periods)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "INSERT INTO users (user_id, name, wins) VALUES (?, ?, 1) "
+                    "ON CONFLICT(user_id) DO UPDATE SET "
+                    "wins = wins + 1, name = COALESCE(?, name) "
+                    "RETURNING wins",
+                    (user_id, display_name or f"UID:{user_id}", display_name or None),
+                ).fetchone()
+                self._conn.executemany(
+                    "INSERT INTO period_wins (period, user_id, wins) VALUES (?, ?, 1) "
+                    "ON CONFLICT(period, user_id) DO UPDATE SET wins = wins + 1",
+                    [(p, user_id) for p in periods],
+                )
+                # "d:2026-10-17" < "d:2026-10-18": xoá theo khoảng trên index (period, ...)
+                self._conn.executemany(
+                    "DELETE FROM period_wins WHERE period > ? AND period < ?",
+                    [(p.split(":", 1)[0] + ":", p) for p in periods],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return int(row["wins"])
+
+    def top(self, n: int = 10, period: Optional[str] = None) -> List[Dict[str, object]]:
+        """Top n theo tổng (period=None) hoặc theo 1 kỳ; đi theo index nên chỉ đọc n dòng."""
+        with self._lock:
+            if period is None:
+                rows = self._conn.execute(
+                    f"SELECT {_COLUMNS} FROM users ORDER BY wins DESC, name LIMIT ?",
+                    (max(0, n),),
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT u.user_id, u.name, p.wins, u.correct_words, u.total_attempts "
+                    "FROM period_wins p JOIN users u ON u.user_id = p.user_id "
+                    "WHERE p.period = ? ORDER BY p.wins DESC, u.name LIMIT ?",
+                    (period, max(0, n)),
+                ).fetchall()
+        return [dict(r) for r in rows]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM users")
+            self._conn.execute("DELETE FROM period_wins")
+
+    def backup_to(self, dest: str) -> None:
+        """Snapshot nhất quán của DB (kể cả phần còn trong WAL) ra file dest."""
+        with self._lock:
+            target = sqlite3.connect(dest)
+            try:
+                self._conn.backup(target)
+            finally:
+                target.close()
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def import_json(self, json_path: str) -> int:
+        """
+        Nhập 1 lần từ leaderboard.json cũ (đánh dấu trong bảng meta nên gọi lại không nhân đôi).
+        Trả về số người chơi đã nhập.
+        """
+        with self._lock:
+            if self._meta("imported_json"):
+                return 0
+            try:
+                with open(json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = {}
+            except json.JSONDecodeError as e:
+                logging.error("Không đọc được %s, bỏ qua import: %s", json_path, e)
+                data = {}
+            if not isinstance(data, dict):
+                data = {}
+
+            rows = [
+                (
+                    str(uid),
+                    str(info.get("name") or f"UID:{uid}"),
+                    int(info.get("wins", 0)),
+                    int(info.get("correct_words", 0)),
+                    int(info.get("total_attempts", 0)),
+                )
+                for uid, info in data.items()
+                if isinstance(info, dict)
+            ]
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT INTO users ({_COLUMNS}) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET "
+                    "name = excluded.name, "
+                    "wins = wins + excluded.wins, "
+                    "correct_words = correct_words + excluded.correct_words, "
+                    "total_attempts = total_attempts + excluded.total_attempts",
+                    rows,
+                )
+                self._conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('imported_json', ?)", (json_path,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if rows:
+            logging.info("Imported %d players from %s", len(rows), json_path)
+        return len(rows)
@@ -0,0 +1,205 @@
+# suggest.py
+import time
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from redis import Redis
+from .utils_vi import norm_phrase
+from .redis_keys import K_DICT
+from .dictionary import current_ns
+from .ratelimit import RateLimiter, MODE_TOKEN_BUCKET
+
+
+def strip_diacritics(s: str) -> str:
+    """Bỏ toàn bộ dấu (thanh + mũ/móc, đ -> d): "cà phê" -> "ca phe"."""
+    d = unicodedata.normalize("NFD", s.replace("đ", "d").replace("Đ", "D"))
+    return "".join(c for c in d if not unicodedata.combining(c))
+
+
+def _deletes(word: str) -> Set[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _within_one(a: str, b: str) -> bool:
+    """Khoảng cách Levenshtein(a, b) <= 1."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        return sum(x != y for x, y in zip(a, b)) == 1
+    if la > lb:
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+
+def _diacritic_diff(a: str, b: str) -> int:
+    # Độ lệch dấu giữa 2 cụm cùng "khung" chữ: số ký tự khác nhau sau chuẩn hoá NFC
+    a, b = unicodedata.normalize("NFC", a), unicodedata.normalize("NFC", b)
+    return sum(x != y for x, y in zip(a, b)) + abs(len(a) - len(b))
+
+
+class SuggestionIndex:
+    """
+    Gợi ý "ý bạn là" cho cụm từ gõ sai, chạy hoàn toàn trong process.
+      - Bỏ dấu để so "khung" chữ: "ca phe" khớp ngay "cà phê" (khoảng cách 0).
+      - Lỗi gõ 1 ký tự: symmetric-delete theo từng âm tiết (bỏ dấu). Chỉ vài nghìn âm tiết
+        nên bảng delete nhỏ; ghép ứng viên từng âm tiết rồi tra bảng khung cụm từ.
+    Dựng 1 lần lúc khởi động (build) và cập nhật dần khi từ điển đổi (add/remove).
+    add/remove đến trong lúc build (thread khác) được ghi lại và áp lên index mới sau khi thay.
+    """
+
+    def __init__(self, max_distance: int = 1):
+        self.max_distance = max_distance
+        self._phrases: Dict[str, Set[str]] = {}  # khung cụm từ -> các cụm có dấu
+        self._deletes: Dict[str, Set[str]] = {}  # biến thể xoá 1 ký tự -> khung âm tiết
+        self._near: Dict[str, List[str]] = {}  # memo: khung âm tiết -> các âm tiết cách 1
+        self._lock = threading.Lock()
+        self._pending: Optional[List[Tuple[bool, str]]] = None  # (là add?, cụm) khi đang build
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._phrases.values())
+
+    @staticmethod
+    def _index_syllable(deletes: Dict[str, Set[str]], syl: str) -> None:
+        deletes.setdefault(syl, set()).add(syl)
+        for d in _deletes(syl):
+            deletes.setdefault(d, set()).add(syl)
+
+    def build(self, phrases: Iterable[str]) -> int:
+        """Dựng lại toàn bộ index (dựng bản mới rồi mới thay, đọc song song vẫn an toàn)."""
+        t0 = time.perf_counter()
+        with self._lock:
+            self._pending = []
+        by_skel: Dict[str, Set[str]] = {}
+        deletes: Dict[str, Set[str]] = {}
+        seen: Set[str] = set()
+        for phrase in phrases:
+            phrase = norm_phrase(phrase)
+            if not phrase:
+                continue
+            skel = strip_diacritics(phrase)
+            by_skel.setdefault(skel, set()).add(phrase)
+            for syl in skel.split(" "):
+                if syl not in seen:
+                    seen.add(syl)
+                    self._index_syllable(deletes, syl)
+        with self._lock:
+            self._phrases, self._deletes, self._near = by_skel, deletes, {}
+            for is_add, phrase in self._pending:
+                if is_add:
+                    self._add(phrase)
+                else:
+                    self._remove(phrase)
+            self._pending = None
+        n = len(self)
+        logging.info(
+            "Suggestion index: %d phrases, %d syllables in %.2fs",
+            n, len(seen), time.perf_counter() - t0,
+        )
+        return n
+
+    def add(self, phrase: str) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((True, phrase))
+            self._add(phrase)
+
+    def remove(self, phrase: str) -> None:
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((False, phrase))
+            self._remove(phrase)
+
+    def _add(self, phrase: str) -> None:
+        phrase = norm_phrase(phrase)
+        if not phrase:
+            return
+        skel = strip_diacritics(phrase)
+        self._phrases.setdefault(skel, set()).add(phrase)
+        for syl in skel.split(" "):
+            if syl not in self._deletes.get(syl, ()):
+                self._index_syllable(self._deletes, syl)
+                self._near = {}
+
+    def _remove(self, phrase: str) -> None:
+        # Bảng âm tiết giữ nguyên: ứng viên luôn được kiểm lại qua bảng cụm từ
+        phrase = norm_phrase(phrase)
+        skel = strip_diacritics(phrase)
+        group = self._phrases.get(skel)
+        if group is not None:
+            group.discard(phrase)
+            if not group:
+                del self._phrases[skel]
+
+    def _neighbours(self, syl: str) -> List[str]:
+        """Các âm tiết (khung) trong index cách syl đúng 1 phép sửa."""
+        near = self._near.get(syl)
+        if near is None:
+            found = set()
+            for probe in {syl} | _deletes(syl):
+                for cand in self._deletes.get(probe, ()):
+                    if cand != syl and _within_one(syl, cand):
+                        found.add(cand)
+            near = self._near[syl] = sorted(found)
+        return near
+
+    def lookup(self, raw: str, limit: int = 3) -> List[Tuple[str, int]]:
+        """
+        Các cụm trong từ điển gần nhất với raw: [(cụm, khoảng cách)], tốt nhất trước.
+        Khoảng cách 0 = chỉ sai/thiếu dấu; 1 = sai thêm 1 ký tự ở 1 âm tiết.
+        """
+        phrase = norm_phrase(raw)
+        if not phrase:
+            return []
+        syllables = strip_diacritics(phrase).split(" ")
+        # (khung cụm từ, khoảng cách): khớp nguyên khung, rồi thay lần lượt từng âm tiết
+        probes = [(" ".join(syllables), 0)]
+        if self.max_distance > 0:
+            for i, syl in enumerate(syllables):
+                for cand in self._neighbours(syl):
+                    probes.append((" ".join(syllables[:i] + [cand] + syllables[i + 1:]), 1))
+        scored = []
+        for skel, dist in probes:
+            for cand in self._phrases.get(skel, ()):
+                if cand != phrase:
+                    scored.append((dist, _diacritic_diff(phrase, cand), cand))
+        scored.sort()
+        return [(cand, dist) for dist, _, cand in scored[:limit]]
+
+
+class HintThrottle:
+    """
+    Giới hạn tin "ý bạn là" (mỗi tin là 1 lần gửi REST):
+      - cùng 1 gợi ý trong 1 kênh chỉ gửi 1 lần mỗi ttl giây (gõ sai lặp lại không spam)
+      - mỗi kênh tối đa per_channel gợi ý / period giây (token bucket, cho dồn ngắn)
+    """
+
+    def __init__(self, ttl: float = 300.0, per_channel: int = 3, period: float = 60.0, maxsize: int = 4096):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._seen: "OrderedDict[Tuple[int, str], float]" = OrderedDict()  # -> hết hạn lúc
+        self._limiter = RateLimiter(per_channel, period, mode=MODE_TOKEN_BUCKET, name="hint")
+
+    async def allow(self, channel_id: int, phrase: str) -> bool:
+        now = time.monotonic()
+        while self._seen and (len(self._seen) > self.maxsize or next(iter(self._seen.values())) <= now):
+            self._seen.popitem(last=False)
+        key = (channel_id, phrase)
+        if key in self._seen:
+            return False
+        if await self._limiter.is_limited(f"channel:{channel_id}"):
+            return False
+        self._seen[key] = now + self.ttl
+        return True
+
+
+def load_from_redis(index: SuggestionIndex, r: Redis, batch: int = 10000) -> int:
+    """Dựng index từ phiên bản từ điển đang phục vụ (client sync, chạy trong thread)."""
+    return index.build(r.sscan_iter(K_DICT(current_ns(r)), count=batch))
@@ -1,11 +1,13 @@
 import re
+import unicodedata
 
 _PUNCT = ".,;:!?\"'()[]{}…–—-/"
+_WS = re.compile(r"\s+")
 
 
 def norm_phrase(s: str) -> str:
     # lowercase + collapse whitespace, KEEP Vietnamese diacritics
-    return re.sub(r"\s+", " ", s.strip().lower())
+    return _WS.sub(" ", s.strip().lower())
 
 
 def _clean_token(tok: str) -> str:
@@ -26,3 +28,99 @@ def last_token(s: str) -> str | None:
         return None
     parts = [t for t in s.split(" ") if _clean_token(t)]
     return _clean_token(parts[-1]) if parts else None  # WITH DIACRITICS
+
+
+def phrase_tokens(raw: str) -> tuple[str, str | None, str | None]:
+    """
+    (phrase, first_token, last_token) chỉ với 1 lần chuẩn hoá — dùng cho nạp hàng loạt.
+    Kết quả giống norm_phrase/first_token/last_token gọi riêng lẻ.
+    """
+    phrase = norm_phrase(raw)
+    if not phrase:
+        return phrase, None, None
+    parts = phrase.split(" ")
+    ft = lt = None
+    for t in parts:
+        c = _clean_token(t)
+        if c:
+            ft = c
+            break
+    if ft is None:
+        return phrase, None, None
+    for t in reversed(parts):
+        c = _clean_token(t)
+        if c:
+            lt = c
+            break
+    return phrase, ft, lt
+
+
+# --- Kiểm tra cấu trúc âm tiết tiếng Việt (lọc nhanh trước khi hỏi AI) ---
+# Âm tiết = (phụ âm đầu) + vần + (thanh). Bỏ dấu thanh (NFD) rồi tách phụ âm đầu,
+# phần còn lại phải là 1 vần hợp lệ (đã gồm âm đệm o/u); vần tắc p/t/c/ch chỉ mang sắc/nặng.
+_TONE_MARKS = {"\u0301": "sac", "\u0300": "huyen", "\u0309": "hoi", "\u0303": "nga", "\u0323": "nang"}
+_STOP_TONES = ("sac", "nang")
+_ONSETS = (
+    "ngh", "ng", "nh", "ch", "gh", "gi", "kh", "ph", "th", "tr", "qu",
+    "b", "c", "d", "đ", "g", "h", "k", "l", "m", "n", "p", "r", "s", "t", "v", "x", "",
+)
+_RHYMES = frozenset("""
+a ai ao au ay am an ang anh ap at ac ach
+ăm ăn ăng ăp ăt ăc
+âu ây âm ân âng âp ât âc
+e eo em en eng ep et ec
+ê êu êm ên ênh êp êt êch
+i ia iu im in inh ip it ich
+iêu iêm iên iêng iêp iêt iêc
+y yêu yêm yên yêng yêt
+o oi om on ong op ot oc oong ooc
+ô ôi ôm ôn ông ôp ôt ôc
+ơ ơi ơm ơn ơp ơt
+u ua ui um un ung up ut uc
+uôi uôm uôn uông uôt uôc
+ư ưa ưi ưu ưm ưn ưng ưt ưc
+ươi ươu ươm ươn ương ươp ươt ươc
+oa oai oay oao oam oan oang oanh oap oat oac oach
+oăm oăn oăng oăt oăc oây
+oe oeo oem oen oeng oet oec
+uâ uân uâng uât uây uăng
+uê uêu uên uênh uêt uêch
+uy uya uyu uyn uynh uyp uyt uych uyên uyêt
+uơ
+ya yn ynh yp yt ych yu
+""".split())  # dòng cuối: vần sau "qu" (quy, quýt, quỳnh...)
+_STOP_CODAS = ("p", "t", "c", "ch")
+_SYLLABLE_SEP = re.compile(r"[\s\-]+")
+
+
+def is_vietnamese_syllable(tok: str) -> bool:
+    """Token có thể là 1 âm tiết tiếng Việt hợp lệ không (chỉ xét cấu trúc, không xét nghĩa)."""
+    d = unicodedata.normalize("NFD", tok.lower())
+    tones = [_TONE_MARKS[c] for c in d if c in _TONE_MARKS]
+    if len(tones) > 1:
+        return False
+    base = unicodedata.normalize("NFC", "".join(c for c in d if c not in _TONE_MARKS))
+    if not base:
+        return False
+    for onset in _ONSETS:
+        if not base.startswith(onset):
+            continue
+        rhyme = base[len(onset):]
+        if onset == "gi" and (not rhyme or rhyme[0] not in "aăâeêoôơuưy"):
+            rhyme = "i" + rhyme  # gì, gìn, giữ -> gi + i...
+        if rhyme not in _RHYMES:
+            continue
+        if tones and rhyme.endswith(_STOP_CODAS) and tones[0] not in _STOP_TONES:
+            continue
+        return True
+    return False
+
+
+def is_plausible_phrase(phrase: str) -> bool:
+    """
+    Mọi âm tiết của cụm từ (tách theo khoảng trắng và gạch nối) đều hợp lệ về cấu trúc.
+    False = chắc chắn không phải từ tiếng Việt, không cần hỏi AI.
+    """
+    parts = [_clean_token(t) for t in _SYLLABLE_SEP.split(norm_phrase(phrase))]
+    parts = [t for t in parts if t]
+    return bool(parts) and all(is_vietnamese_syllable(t) for t in parts)
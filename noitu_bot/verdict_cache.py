@@ -0,0 +1,80 @@
+# verdict_cache.py
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from redis.asyncio import Redis
+from .config import AI_VERDICT_TTL_POSITIVE, AI_VERDICT_TTL_NEGATIVE
+from .redis_keys import K_AI_VERDICT
+
+try:
+    from .monitoring_server import AI_VERDICT_CACHE_COUNTER
+except ImportError:
+    class DummyCounter:
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self):
+            pass
+
+
+    AI_VERDICT_CACHE_COUNTER = DummyCounter()
+
+VERDICT_YES = "có"
+VERDICT_NO = "không"
+
+
+class VerdictCache:
+    """
+    Bọc hàm AI kiểm tra từ (check_vietnamese_word):
+      - cache kết quả trong Redis, TTL riêng cho "có" và "không"
+      - single-flight: nhiều lượt kiểm tra cùng 1 từ (đã chuẩn hoá) chờ chung 1 lời gọi AI
+      - hàm check trả None khi bị rate limit (limiter nằm ở tầng gom lô AI, mỗi lô 1 lượt)
+    Lỗi gọi AI và kết quả None không được cache (lần sau sẽ thử lại).
+    """
+
+    def __init__(
+        self,
+        r: Redis,
+        check: Callable[[str], Awaitable[Optional[str]]],
+        *,
+        ttl_positive: int = AI_VERDICT_TTL_POSITIVE,
+        ttl_negative: int = AI_VERDICT_TTL_NEGATIVE,
+    ):
+        self.r = r
+        self._check = check
+        self.ttl_positive = ttl_positive
+        self.ttl_negative = ttl_negative
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def check(self, word: str) -> Optional[str]:
+        """Verdict "có"/"không" của từ (đã chuẩn hoá); None nếu bị rate limit."""
+        cached = await self.r.get(K_AI_VERDICT(word))
+        if cached is not None:
+            AI_VERDICT_CACHE_COUNTER.labels(result="hit").inc()
+            return cached
+
+        task = self._inflight.get(word)
+        if task is not None:
+            AI_VERDICT_CACHE_COUNTER.labels(result="shared").inc()
+            return await asyncio.shield(task)
+
+        # Đăng ký in-flight ngay sau khi trượt cache (không await xen giữa) để các lượt
+        # cùng từ chờ chung
+        task = asyncio.create_task(self._resolve(word))
+        self._inflight[word] = task
+        task.add_done_callback(lambda _: self._inflight.pop(word, None))
+        return await asyncio.shield(task)
+
+    async def _resolve(self, word: str) -> Optional[str]:
+        answer = await self._check(word)
+        if answer is None:
+            AI_VERDICT_CACHE_COUNTER.labels(result="limited").inc()
+            return None
+        AI_VERDICT_CACHE_COUNTER.labels(result="miss").inc()
+        verdict = VERDICT_YES if answer == VERDICT_YES else VERDICT_NO
+        ttl = self.ttl_positive if verdict == VERDICT_YES else self.ttl_negative
+        try:
+            await self.r.set(K_AI_VERDICT(word), verdict, ex=ttl)
+        except Exception as e:
+            logging.warning("Không thể cache verdict cho '%s': %s", word, e)
+        return verdict
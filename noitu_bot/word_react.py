@@ -1,5 +1,6 @@
 # word_react.py
 import os
+import time
 import asyncio
 import logging
 from pathlib import Path
@@ -28,42 +29,78 @@ from .redis_keys import (
 
 from .utils_vi import norm_phrase, first_token, last_token
 from .blacklist_utils import add_to_blacklist
+from .dictionary import dict_add_phrase, dict_remove_phrase, dict_contains
+
+try:
+    from .monitoring_server import REACTION_REST_CALLS
+except ImportError:
+    class DummyCounter:
+        def labels(self, *args, **kwargs):
+            return self
+
+        def inc(self):
+            pass
+
+
+    REACTION_REST_CALLS = DummyCounter()
 
 EMOJI_ADD = "❤️"
 EMOJI_DEL = "❌"
 
 
-def add_word_to_dictionary(r, phrase: str, ref) -> bool:
+class ModeratorCache:
+    """
+    Cache "user có role quản lý từ điển không" theo user_id, hết hạn sau ttl giây
+    (đổi role có hiệu lực chậm nhất sau ttl). Chỉ gọi REST fetch_member khi cache trượt
+    và member cũng không có trong cache của discord.py.
+    """
+
+    def __init__(self, role_id: int, ttl: float = 300.0):
+        self.role_id = role_id
+        self.ttl = ttl
+        self._entries: dict = {}  # user_id -> (is_mod, hết hạn lúc)
+
+    def _store(self, user_id: int, member) -> bool:
+        is_mod = any(role.id == self.role_id for role in member.roles)
+        self._entries[user_id] = (is_mod, time.monotonic() + self.ttl)
+        return is_mod
+
+    async def is_moderator(self, guild, user_id: int, member=None) -> bool:
+        if member is not None:
+            return self._store(user_id, member)
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            REACTION_REST_CALLS.labels(call="fetch_member", result="avoided").inc()
+            return entry[0]
+        if guild is None:
+            return False
+        member = guild.get_member(user_id)
+        if member is not None:
+            REACTION_REST_CALLS.labels(call="fetch_member", result="avoided").inc()
+        else:
+            REACTION_REST_CALLS.labels(call="fetch_member", result="made").inc()
+            try:
+                member = await guild.fetch_member(user_id)
+            except discord.NotFound:
+                self._entries[user_id] = (False, time.monotonic() + self.ttl)
+                return False
+        return self._store(user_id, member)
+
+
+async def add_word_to_dictionary(r, phrase: str, games, journal, suggestions) -> bool:
     phrase = phrase.lower()
     print("vào thêm từ")
-    if r.sismember(K_DICT(), phrase):
+    if await dict_contains(r, phrase):
         return False
     try:
-        with open(DICT_PATH, "a+", encoding="utf-8") as f:
-            f.seek(0, os.SEEK_END)
-            if f.tell() > 0:
-                f.seek(f.tell() - 1)
-                if f.read(1) != "\n":
-                    f.write("\n")
-            f.write(phrase + "\n")
+        await asyncio.to_thread(journal.add, phrase)
     except Exception as e:
-        logging.error(f"Failed to write word '{phrase}' to dictionary file: {e}")
+        logging.error(f"Failed to write word '{phrase}' to dictionary journal: {e}")
         return False
-    ft = first_token(phrase)
-    pipe = r.pipeline()
-    pipe.sadd(K_DICT(), phrase)
-    pipe.sadd(K_TOKEN_IDX(ft), phrase)
-
-    last = r.get(K_LAST_WORD(ref.gid))
-    need_tok = last_token(last) if last else None
-    if need_tok == ft:
-        used_key = K_USED_TOKEN(ref.gid, ft)
-        rem_key = K_REMAIN(ref.gid, ft)
-        if r.exists(rem_key) and not r.sismember(used_key, phrase):
-            pipe.sadd(rem_key, phrase)
-
     try:
-        pipe.execute()
+        await dict_add_phrase(r, phrase)
+        await games.note_added(phrase)
+        suggestions.add(phrase)
         return True
     except Exception as e:
         logging.error(f"Failed to add word '{phrase}' to Redis: {e}")
@@ -73,10 +110,11 @@ def add_word_to_dictionary(r, phrase: str, ref) -> bool:
 async def handle_word_react(
     bot,
     r,
-    ref,
-    channel_id,
-    role_id,
-    dict_path,
+    games,
+    moderators,
+    journal,
+    suggestions,
+    recent_messages,
     norm_phrase,
     first_token,
     last_token,
@@ -89,33 +127,32 @@ async def handle_word_react(
 ):
     if not bot.user or payload.user_id == bot.user.id:
         return
-    if payload.channel_id != channel_id:
+    if not games.is_game_channel(payload.channel_id):
         return
     emoji = str(payload.emoji)
     if emoji not in {EMOJI_ADD, EMOJI_DEL}:
         return
 
     guild = bot.get_guild(payload.guild_id)
-    member = payload.member
-    if member is None and guild is not None:
-        try:
-            member = await guild.fetch_member(payload.user_id)
-        except discord.NotFound:
-            member = None
-    if not member:
-        return
-    if not any(role.id == role_id for role in member.roles):
+    if not await moderators.is_moderator(guild, payload.user_id, payload.member):
         return
 
     channel = bot.get_channel(payload.channel_id)
     if not channel:
         return
-    try:
-        msg = await channel.fetch_message(payload.message_id)
-    except discord.NotFound:
-        return
+    # Nội dung tin lấy từ ring buffer của kênh; chỉ gọi REST khi tin đã bị đẩy ra
+    content = recent_messages.get(payload.channel_id, payload.message_id)
+    if content is not None:
+        REACTION_REST_CALLS.labels(call="fetch_message", result="avoided").inc()
+    else:
+        REACTION_REST_CALLS.labels(call="fetch_message", result="made").inc()
+        try:
+            msg = await channel.fetch_message(payload.message_id)
+        except discord.NotFound:
+            return
+        content = msg.content or ""
 
-    content = (msg.content or "").strip()
+    content = content.strip()
     if len(content.split()) != 2:
         return
 
@@ -124,46 +161,25 @@ async def handle_word_react(
     if not ft:
         return
 
-    dict_path = Path(dict_path)
-
     if emoji == EMOJI_ADD:
         print("vào thêm từ")
-        if r.sismember(K_DICT(), phrase):
+        if await dict_contains(r, phrase):
             try:
                 await channel.send(f"⚠️ Từ **{content}** đã tồn tại trong từ điển.")
             except discord.HTTPException as e:
                 logging.error(f"Failed to send duplicate word message: {e}")
             return
 
-        def write_word_to_file():
-            with open(dict_path, "a+", encoding="utf-8") as f:
-                f.seek(0, os.SEEK_END)
-                if f.tell() > 0:
-                    f.seek(f.tell() - 1)
-                    if f.read(1) != "\n":
-                        f.write("\n")
-                f.write(phrase + "\n")
-
         try:
-            await asyncio.to_thread(write_word_to_file)
+            await asyncio.to_thread(journal.add, phrase)
         except Exception as e:
-            logging.error(f"Failed to write word '{phrase}' to file: {e}")
+            logging.error(f"Failed to write word '{phrase}' to journal: {e}")
             return
 
-        pipe = r.pipeline()
-        pipe.sadd(K_DICT(), phrase)
-        pipe.sadd(K_TOKEN_IDX(ft), phrase)
-
-        last = r.get(K_LAST_WORD(ref.gid))
-        need_tok = last_token(last) if last else None
-        if need_tok == ft:
-            used_key = K_USED_TOKEN(ref.gid, ft)
-            rem_key = K_REMAIN(ref.gid, ft)
-            if r.exists(rem_key) and not r.sismember(used_key, phrase):
-                pipe.sadd(rem_key, phrase)
-
         try:
-            pipe.execute()
+            await dict_add_phrase(r, phrase)
+            await games.note_added(phrase)
+            suggestions.add(phrase)
             await channel.send(
                 f"✅ Đã thêm **{content}** vào từ điển (dùng được ngay)!"
             )
@@ -173,42 +189,18 @@ async def handle_word_react(
             logging.error(f"Unexpected error adding word to Redis: {e}")
 
     elif emoji == EMOJI_DEL:
-        if not r.sismember(K_DICT(), phrase):
+        if not await dict_contains(r, phrase):
             try:
                 await channel.send(f"⚠️ Từ **{content}** không có trong từ điển.")
             except discord.HTTPException as e:
                 logging.error(f"Failed to send word not found message: {e}")
             return
 
-        def remove_word_from_file():
-            src = Path(dict_path)
-            tmp = src.with_suffix(src.suffix + ".tmp")
-            removed = False
-            with open(src, "r", encoding="utf-8") as fin, open(
-                tmp, "w", encoding="utf-8"
-            ) as fout:
-                for line in fin:
-                    if norm_phrase(line.strip()) == phrase:
-                        removed = True
-                        continue
-                    fout.write(line)
-            if removed:
-                os.replace(tmp, src)
-                return True
-            else:
-                try:
-                    tmp.unlink(missing_ok=True)
-                except Exception as e:
-                    logging.warning(f"Failed to delete temp file: {e}")
-                return False
-
         try:
-            removed = await asyncio.to_thread(remove_word_from_file)
-            if not removed:
-                await channel.send("⚠️ Không thấy dòng cần xoá trong file.")
-                return
+            # Ghi tombstone vào journal; file snapshot được gộp lại ở lần compact nền
+            await asyncio.to_thread(journal.remove, phrase)
         except Exception as e:
-            logging.error(f"Failed to remove word '{phrase}' from file: {e}")
+            logging.error(f"Failed to remove word '{phrase}' from journal: {e}")
             try:
                 await channel.send(f"❌ Lỗi khi xoá file: {e}")
             except discord.HTTPException as http_err:
@@ -216,16 +208,11 @@ async def handle_word_react(
             return
 
         try:
-            pipe = r.pipeline()
-            pipe.srem(K_DICT(), phrase)
-            pipe.srem(K_TOKEN_IDX(ft), phrase)
-            used_key = K_USED_TOKEN(ref.gid, ft)
-            rem_key = K_REMAIN(ref.gid, ft)
-            pipe.srem(rem_key, phrase)
-            pipe.srem(used_key, phrase)
-            pipe.execute()
+            await games.note_removed(phrase)
+            await dict_remove_phrase(r, phrase)
+            suggestions.remove(phrase)
             await channel.send(f"❌ Đã xoá **{content}** khỏi từ điển.")
-            added = add_to_blacklist(r, phrase, "words/blacklist.txt")
+            added = await add_to_blacklist(r, phrase, "words/blacklist.txt")
             if added.get("redis_added") or added.get("file_added"):
                 print(f"[BLACKLIST] Đã thêm '{phrase}' vào blacklist")
             else: